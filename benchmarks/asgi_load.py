@@ -0,0 +1,169 @@
+"""
+Concurrency per worker: threaded WSGI versus project/asgi.py
+
+Fires register step 1 requests - a verification code for a new phone -
+from `--clients` concurrent clients at one worker process, in-process,
+no sockets involved:
+
+    wsgi  a threaded WSGI worker (like gunicorn --threads): each request
+          holds one of `--threads` threads from the first byte of its
+          body to the end of its response
+    asgi  project.asgi.application with ASGI_THREADS = `--threads`: the
+          body is received on the event loop, a thread runs the view only
+
+Clients upload their body in `--client-delay` seconds, like mobile
+clients on slow networks. The codes are sent by LocalProvider taking
+`--sms-delay` seconds, inside the request, or queued in the SMS outbox:
+
+    python benchmarks/asgi_load.py --clients 200 --threads 16
+
+Run it against the configured database and cache; it creates no users,
+but leaves the queued messages in the outbox.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from project.asgi import WsgiToAsgi  # noqa: E402
+
+PATH = '/api/v1/users/register/'
+
+
+class InFlight(object):
+    """Requests inside the application, and the peak of that"""
+
+    def __init__(self, application):
+        self.application = application
+        self.current = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            response = self.application(environ, start_response)
+            return [b''.join(response)]
+        finally:
+            with self._lock:
+                self.current -= 1
+
+
+def body_of(i):
+    return json.dumps({'phone': '1990%07d' % i}).encode()
+
+
+def environ_of(body):
+    return {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': PATH, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+
+def run_wsgi(application, args):
+    statuses = Counter()
+
+    def request(i):
+        # a sync worker thread reads the body off the socket itself
+        time.sleep(args.client_delay)
+        status = []
+        application(environ_of(body_of(i)), lambda s, headers: status.append(s))
+        statuses[status[0].split()[0]] += 1
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(request, range(args.clients)))
+    return statuses
+
+
+def run_asgi(application, args):
+    statuses = Counter()
+
+    async def request(i):
+        body = body_of(i)
+        parts = [body[:len(body) // 2], body[len(body) // 2:]]
+
+        async def receive():
+            await asyncio.sleep(args.client_delay / 2)
+            part = parts.pop(0)
+            return {'type': 'http.request', 'body': part, 'more_body': bool(parts)}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses[str(message['status'])] += 1
+
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': PATH, 'query_string': b'',
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 40000 + i), 'server': ('localhost', 80),
+        }
+        await application(scope, receive, send)
+
+    async def clients():
+        await asyncio.gather(*[request(i) for i in range(args.clients)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(clients())
+    finally:
+        loop.close()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--client-delay', type=float, default=0.5)
+    parser.add_argument('--sms-delay', type=float, default=0.3)
+    args = parser.parse_args()
+
+    settings = dict(
+        SMS_PROVIDER='users.providers.LocalProvider',
+        SMS_LOCAL_DELAY=args.sms_delay,
+        PHONE_BLOOM_ENABLED=False,
+        RATE_LIMITS={'sms_code': {}},
+    )
+    print('%d clients, %d threads, %.2fs uploads, %.2fs SMS provider' % (
+        args.clients, args.threads, args.client_delay, args.sms_delay))
+    for outbox in (False, True):
+        for name in ('wsgi', 'asgi'):
+            with override_settings(SMS_OUTBOX_ENABLED=outbox, **settings):
+                in_flight = InFlight(get_wsgi_application())
+                if name == 'wsgi':
+                    start = time.monotonic()
+                    statuses = run_wsgi(in_flight, args)
+                else:
+                    application = WsgiToAsgi(in_flight, args.threads)
+                    start = time.monotonic()
+                    statuses = run_asgi(application, args)
+                    application.executor.shutdown()
+                elapsed = time.monotonic() - start
+            print('  %s, SMS %-6s %6.1f requests/sec  %5.2fs  peak %3d in views  %s' % (
+                name, 'queued' if outbox else 'inline', args.clients / elapsed,
+                elapsed, in_flight.peak, dict(statuses)))
+
+
+if __name__ == '__main__':
+    main()
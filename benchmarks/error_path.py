@@ -0,0 +1,67 @@
+"""
+Error path throughput: rendering every APIError response versus the
+pre-rendered bodies of `users.views.errors.error_catalog`
+
+Runs a view raising IncorrectPassword - a context-free error, like most
+failed logins - through the full DRF dispatch, with the catalog disabled
+and enabled, and reports the requests per second of both:
+
+    python benchmarks/error_path.py --requests 20000
+
+No database or cache is used.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from users.views.base import UnauthenticatedAPIView  # noqa: E402
+from users.views.errors import IncorrectPassword, error_catalog  # noqa: E402
+
+
+class FailingView(UnauthenticatedAPIView):
+    throttle_classes = ()
+
+    def post(self, request):
+        raise IncorrectPassword()
+
+
+def measure(view, request, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = view(request)
+        response.render()
+    return count / (time.perf_counter() - start), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    view = FailingView.as_view()
+    request = APIRequestFactory().post('/', {}, format='json')
+
+    results = {}
+    for name, enabled in [('rendered', False), ('catalog', True)]:
+        error_catalog.enabled = enabled
+        measure(view, request, min(args.requests, 1000))
+        results[name] = measure(view, request, args.requests)
+
+    print('%d requests raising IncorrectPassword' % args.requests)
+    for name, (rate, response) in results.items():
+        print('  %-8s %8.0f requests/sec  %s' % (name, rate, response.content))
+    print('  speedup  %8.2fx' % (results['catalog'][0] / results['rendered'][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Per-request overhead of the middleware profiles
+
+Sends the same API requests through Django's WSGI handler with:
+
+    flat  the former MIDDLEWARE, browser machinery included, and DRF's
+          default token and session authentication
+    full  users.middleware.ProfileMiddleware, API_PROFILE_PREFIXES = []
+    api   users.middleware.ProfileMiddleware, the /api/ profile
+
+and reports the microseconds per request of each:
+
+    python benchmarks/middleware_profiles.py --requests 5000
+
+The requests are rejected before any query - an unauthenticated GET of
+the user details and a register step 1 with an invalid phone - so the
+timings are the request handling overhead only.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+PROFILE_MIDDLEWARE = 'users.middleware.ProfileMiddleware'
+
+# MIDDLEWARE as it was, with anything the installed apps add to it
+FLAT_MIDDLEWARE = [path for path in settings.MIDDLEWARE
+                   if path != PROFILE_MIDDLEWARE] + settings.FULL_PROFILE_MIDDLEWARE
+
+PROFILES = [
+    ('flat', dict(MIDDLEWARE=FLAT_MIDDLEWARE)),
+    ('full', dict(API_PROFILE_PREFIXES=[])),
+    ('api', dict(API_PROFILE_PREFIXES=['/api/'])),
+]
+
+REQUESTS = [
+    ('GET user details', 'GET', '/api/v1/users/user_details/', b''),
+    ('POST register', 'POST', '/api/v1/users/register/',
+     json.dumps({'phone': '123'}).encode()),
+]
+
+
+def environ_of(method, path, body):
+    return {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)), 'HTTP_COOKIE': 'sessionid=none',
+        'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+
+def measure(application, method, path, body, count):
+    statuses = set()
+
+    def start_response(status, headers):
+        statuses.add(status)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        response = application(environ_of(method, path, body), start_response)
+        b''.join(response)
+        response.close()
+    return (time.perf_counter() - start) / count * 1e6, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    print('%d requests each (microseconds per request)' % args.requests)
+    for label, method, path, body in REQUESTS:
+        print('  %s' % label)
+        for name, overrides in PROFILES:
+            with override_settings(**overrides):
+                application = get_wsgi_application()
+                measure(application, method, path, body, min(args.requests, 500))
+                timing, statuses = measure(application, method, path, body, args.requests)
+            print('    %-5s %8.1f  %s' % (name, timing, ', '.join(sorted(statuses))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Login lookup latency: `phone` VARCHAR unique index versus the
+(`phone_key` BIGINT, `verified`) index
+
+Fills two scratch tables shaped like users_user before and after the
+phone_key migration with the same synthetic phones, then times random
+point lookups of verified users on both:
+
+    old: SELECT id FROM bench_phone_old WHERE phone = %s AND verified
+    new: SELECT id FROM bench_phone_new WHERE phone_key = %s AND verified
+
+Run against the configured database (MySQL), from the project root:
+
+    python benchmarks/phone_lookup.py --rows 10000000 --lookups 20000
+
+Filling 10 million rows takes a while; pass --keep to reuse the tables
+on the next run.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+TABLES = {
+    'old': ('CREATE TABLE bench_phone_old ('
+            ' id INTEGER PRIMARY KEY,'
+            ' phone VARCHAR(30) NULL UNIQUE,'
+            ' verified BOOL NOT NULL)'),
+    'new': ('CREATE TABLE bench_phone_new ('
+            ' id INTEGER PRIMARY KEY,'
+            ' phone VARCHAR(30) NULL UNIQUE,'
+            ' phone_key BIGINT NULL,'
+            ' verified BOOL NOT NULL)'),
+}
+QUERIES = {
+    'old': 'SELECT id FROM bench_phone_old WHERE phone = %s AND verified',
+    'new': 'SELECT id FROM bench_phone_new WHERE phone_key = %s AND verified',
+}
+
+
+def phone_of(i):
+    # spread over the 13x - 19x prefixes, like real numbers
+    return '1%d%09d' % (3 + i % 7, i)
+
+
+def table_rows(cursor, table):
+    cursor.execute('SELECT COUNT(*) FROM %s' % table)
+    return cursor.fetchone()[0]
+
+
+def fill(cursor, rows, batch_size=10000):
+    for name, ddl in TABLES.items():
+        cursor.execute(ddl)
+    cursor.execute('CREATE INDEX bench_phone_new_key ON bench_phone_new (phone_key, verified)')
+    start = time.monotonic()
+    for first in range(0, rows, batch_size):
+        old, new = [], []
+        for i in range(first, min(first + batch_size, rows)):
+            national = phone_of(i)
+            verified = i % 10 != 0
+            old.append((i + 1, national, verified))
+            new.append((i + 1, '+86' + national, int('86' + national), verified))
+        cursor.executemany('INSERT INTO bench_phone_old VALUES (%s, %s, %s)', old)
+        cursor.executemany('INSERT INTO bench_phone_new VALUES (%s, %s, %s, %s)', new)
+        if first and first % (batch_size * 100) == 0:
+            print('  %d rows, %.0f rows/sec' % (first, first / (time.monotonic() - start)))
+
+
+def measure(cursor, name, params):
+    sql = QUERIES[name]
+    timings = []
+    for value in params:
+        start = time.perf_counter()
+        cursor.execute(sql, [value])
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return dict(
+        mean=statistics.mean(timings) * 1e6,
+        p50=timings[len(timings) // 2] * 1e6,
+        p99=timings[int(len(timings) * 0.99)] * 1e6)
+
+
+def index_sizes(cursor):
+    if connection.vendor != 'mysql':
+        return {}
+    cursor.execute(
+        "SELECT table_name, index_name, stat_value * @@innodb_page_size "
+        "FROM mysql.innodb_index_stats "
+        "WHERE database_name = DATABASE() AND stat_name = 'size' "
+        "AND table_name LIKE 'bench_phone_%%'")
+    return {'%s.%s' % (table, index): size for table, index, size in cursor.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--keep', action='store_true', help="don't drop the tables")
+    args = parser.parse_args()
+
+    with connection.cursor() as cursor:
+        existing = connection.introspection.table_names(cursor)
+        if 'bench_phone_old' not in existing:
+            print('Filling %d rows ...' % args.rows)
+            fill(cursor, args.rows)
+        rows = table_rows(cursor, 'bench_phone_old')
+
+        sample = [phone_of(random.randrange(rows)) for _ in range(args.lookups)]
+        # warm up the buffer pool for both, then measure
+        measure(cursor, 'old', sample[:1000])
+        measure(cursor, 'new', [int('86' + p) for p in sample[:1000]])
+        results = {
+            'old': measure(cursor, 'old', sample),
+            'new': measure(cursor, 'new', [int('86' + p) for p in sample]),
+        }
+
+        print('%d rows, %d lookups (microseconds)' % (rows, args.lookups))
+        for name, result in results.items():
+            print('  %-4s %s  mean %8.1f  p50 %8.1f  p99 %8.1f' % (
+                name, QUERIES[name], result['mean'], result['p50'], result['p99']))
+        for index, size in sorted(index_sizes(cursor).items()):
+            print('  index %-45s %8.1f MB' % (index, size / 1024 / 1024))
+
+        if not args.keep:
+            cursor.execute('DROP TABLE bench_phone_old')
+            cursor.execute('DROP TABLE bench_phone_new')
+
+
+if __name__ == '__main__':
+    main()
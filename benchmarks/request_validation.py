@@ -0,0 +1,82 @@
+"""
+Request validation cost: DRF serializers versus the compiled
+`users.views.validation.RequestValidator`
+
+Validates typical login and register payloads the way the views did -
+create the serializer, `is_valid()`, then read `serializer.data` once per
+value used - and with the compiled validator, and reports the
+validations per second of both:
+
+    python benchmarks/request_validation.py --rounds 20000
+
+No database or cache is used.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from users.views.user import (  # noqa: E402
+    PasswordLoginSerializer, PhoneCodeSerializer, RegisterSerializer,
+    RegisterStep2Serializer)
+from users.views.errors import SerializerValidationError  # noqa: E402
+from users.views.validation import RequestValidator  # noqa: E402
+
+PAYLOADS = [
+    ('password login', PasswordLoginSerializer,
+     {'phone': '18600001111', 'password': 'passw0rd!x'}),
+    ('code login, step 1', PhoneCodeSerializer, {'phone': '+86 186 0000 1111'}),
+    ('code login, step 2', PhoneCodeSerializer, {'phone': '18600001111', 'code': '123456'}),
+    ('register, step 1', RegisterSerializer, {'phone': '18600001111'}),
+    ('register, step 2', RegisterStep2Serializer,
+     {'phone': '18600001111', 'code': '123456', 'password': 'passw0rd!x'}),
+    ('invalid phone', PasswordLoginSerializer, {'phone': '1860000', 'password': ''}),
+]
+
+
+def with_serializer(serializer_class, data):
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        return serializer.errors
+    # the views read one value per access
+    return [serializer.data.get(name) for name in data]
+
+
+def with_validator(validator, data):
+    try:
+        validated = validator.validate(data)
+    except SerializerValidationError as e:
+        return e
+    return [validated.get(name) for name in data]
+
+
+def measure(func, arg, data, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg, data)
+    return rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('%d rounds (validations/sec)' % args.rounds)
+    for name, serializer_class, data in PAYLOADS:
+        validator = RequestValidator(serializer_class)
+        serializer_rate = measure(with_serializer, serializer_class, data, args.rounds)
+        validator_rate = measure(with_validator, validator, data, args.rounds)
+        print('  %-20s serializer %9.0f  compiled %9.0f  %6.1fx' % (
+            name, serializer_rate, validator_rate, validator_rate / serializer_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+ASGI config for project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for ASGI servers like uvicorn or daphne:
+
+    uvicorn project.asgi:application --workers 4
+
+Django 2.0 handles requests synchronously only, so ``application`` runs
+Django's WSGI handler on a pool of ASGI_THREADS threads. The event loop
+receives the whole request body before a thread is taken, so slow
+uploads hold no thread; the thread then runs the view and hands the
+response over to the server.
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+
+def build_environ(scope, body):
+    """WSGI environ of an ASGI http `scope`, PEP 3333 strings"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = client[0], str(client[1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            # repeated headers are joined - cookies with their own separator
+            value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+        environ[name] = value
+    return environ
+
+
+class WsgiToAsgi(object):
+    """
+    ASGI application running a WSGI one in a thread pool
+
+    The response is iterated, and closed, in the thread which ran the
+    application - Django's database connections are per thread - and
+    streamed to the client as it's produced.
+    """
+
+    def __init__(self, wsgi_application, max_workers):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError("Unsupported ASGI scope type %r" % scope['type'])
+
+        body = await self.read_body(receive)
+        if body is None:
+            # the client is gone
+            return
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            self.executor, self.run, build_environ(scope, body), send, loop)
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def run(self, environ, send, loop):
+        """Run the WSGI application, in a pool thread"""
+        def send_sync(message):
+            # wait for each message - the server's flow control
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                  for name, value in headers]
+
+        def send_start():
+            send_sync({'type': 'http.response.start', 'status': started['status'],
+                       'headers': started['headers']})
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            head_sent = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not head_sent:
+                    send_start()
+                    head_sent = True
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not head_sent:
+                send_start()
+            send_sync({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+wsgi_application = get_wsgi_application()
+
+application = WsgiToAsgi(wsgi_application, settings.ASGI_THREADS)
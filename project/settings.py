@@ -52,14 +52,32 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, to time the whole stack
+    'users.metrics.MetricsMiddleware',
+    # off unless QUERY_TRACE_ENABLED
+    'users.querytrace.QueryTraceMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'users.routers.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # runs FULL_PROFILE_MIDDLEWARE, see users/middleware.py
+    'users.middleware.ProfileMiddleware',
+    # last, around the view only
+    'users.profiler.SamplingProfilerMiddleware',
+]
+
+# browser machinery, skipped for the token-only API_PROFILE_PREFIXES
+FULL_PROFILE_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+API_PROFILE_PREFIXES = ['/api/']
+# DRF authentication on the API profile, no sessions there
+API_PROFILE_AUTHENTICATION_CLASSES = [
+    'users.authentication.DeviceSessionAuthentication',
+]
 
 ROOT_URLCONF = 'project.urls'
 
@@ -87,6 +105,20 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # please override this setting in your local_settings.py
 DATABASES = NotImplemented
 
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+        'KEY_PREFIX': 'users',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 
@@ -221,11 +253,157 @@ ALIYUN_ACCESS_KEY_SECRET = ""
 # otherwise we use a dummy client
 SMS_BACKEND = 'sms.backends.dummy.DummySMSBackend'
 
+# provider delivering our verification codes, see users/providers.py
+# please enable luosimao when need sms gateway
+# SMS_PROVIDER = 'users.providers.LuosimaoProvider'
+SMS_PROVIDER = 'users.providers.DummyProvider'
+
+# queue text messages in the SMSOutbox table, delivered by
+# `manage.py sms_worker`. Set False to send inside the request.
+SMS_OUTBOX_ENABLED = True
+SMS_OUTBOX_MAX_ATTEMPTS = 5
+# retry backoff in seconds: 2, 4, 8... up to the max
+SMS_OUTBOX_RETRY_DELAY = 2
+SMS_OUTBOX_RETRY_MAX_DELAY = 300
+# seconds a worker owns the messages it claimed
+SMS_OUTBOX_LEASE = 60
+# `manage.py purge_stale` deletes sent and failed messages older than this
+SMS_OUTBOX_KEEP_DAYS = 7
+
+# verification codes, see users/verification.py
+VERIFICATION_CODE_STORE = 'users.verification.RedisCodeStore'
+VERIFICATION_CODE_LENGTH = 6
+# seconds a code stays valid
+VERIFICATION_CODE_TIMEOUT = 300
+# wrong guesses before a code is burnt
+VERIFICATION_CODE_MAX_ATTEMPTS = 5
+# development only: always send, and always accept, this code - ignored
+# unless SMS_PROVIDER is the DummyProvider
+VERIFICATION_CODE_FIXED = '111111'
+
+# seconds a succeeded registration is replayed to a client retrying it
+REGISTER_RETRY_WINDOW = 300
+
 TOTAL_COLLECTION_NUMBERS = 10
 
+# `manage.py purge_stale` deletes users who didn't verify their phone
+# within this many days
+PURGE_UNVERIFIED_AFTER_DAYS = 30
+
+# seconds a device stays logged in, see users/models/session.py
+DEVICE_SESSION_TIMEOUT = 30 * 24 * 3600
+
+# users.last_login & session last_seen are written behind, in bulk,
+# see users/writebehind.py. Flush every N seconds or M pending rows.
+ACTIVITY_FLUSH_INTERVAL = 10
+ACTIVITY_FLUSH_SIZE = 500
+
+# token -> user cache used by users.authentication.CachedTokenAuthentication
+# shared (redis) tier, in seconds
+TOKEN_CACHE_TIMEOUT = 300
+# in-process LRU tier, in seconds - set 0 to disable it.
+# Other workers may keep accepting a revoked token for at most this long.
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+TOKEN_CACHE_LOCAL_MAXSIZE = 10000
+
+# read replicas, see users/routers.py - aliases of DATABASES
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['users.routers.ReplicaRouter']
+# seconds a client's reads stay on the primary after it wrote
+REPLICA_STICKY_SECONDS = 10
+# replicas lagging more seconds than this are skipped
+REPLICA_MAX_LAG = 5
+# seconds between two lag checks of a replica, per process
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+# users admin pages by primary key ranges with an estimated row count,
+# see users/admin.py - False restores Django's counting/OFFSET changelist
+USER_ADMIN_LARGE_TABLE = True
+
+# seconds per-user responses stay cached, see users/caching.py
+USER_RESPONSE_CACHE_TIMEOUT = 3600
+
+# service name: key, sent as X-Service-Key to the internal endpoints,
+# see users/permissions.py - set the real keys in local_settings.py
+INTERNAL_SERVICE_KEYS = {}
+
+# POST v1/users/lookup/ - values per request and seconds records stay cached
+USER_LOOKUP_MAX_ITEMS = 500
+USER_LOOKUP_CACHE_TIMEOUT = 60
+
+# bloom filter of verified phones, see users/bloom.py
+# resize with `manage.py rebuild_phone_bloom` after changing the capacity or error rate
+PHONE_BLOOM_ENABLED = True
+PHONE_BLOOM_CAPACITY = 10000000
+PHONE_BLOOM_ERROR_RATE = 0.001
+# seconds between refreshes of the per-process copy
+PHONE_BLOOM_REFRESH_INTERVAL = 300
+
+# latency, error and cache metrics, see users/metrics.py - exported at /ht/metrics/
+METRICS_ENABLED = True
+# where each process writes its numbers, and how often in seconds
+METRICS_DIR = os.path.join(LOG_ROOT, 'metrics')
+METRICS_FLUSH_INTERVAL = 10
+
+# per-view query summaries and EXPLAIN of slow queries, see users/querytrace.py
+QUERY_TRACE_ENABLED = False
+# queries this slow, in seconds, are sampled - this share of them EXPLAINed
+QUERY_TRACE_SLOW_SECONDS = 0.2
+QUERY_TRACE_SAMPLE_RATE = 0.1
+# seconds covered by each LOG_ROOT/query-summary.<pid>.txt, statements listed
+QUERY_TRACE_SUMMARY_INTERVAL = 300
+QUERY_TRACE_TOP = 20
+
+# sampling profiler, see users/profiler.py - profiles the requests with the
+# X-Profile-Token of `manage.py profiler_token`, and this share of the others
+PROFILER_SAMPLE_RATE = 0
+# seconds between two samples of the stack of a profiled request
+PROFILER_INTERVAL = 0.005
+PROFILER_TOKEN_MAX_AGE = 3600
+PROFILER_DIR = os.path.join(LOG_ROOT, 'profiles')
+
+# memory diagnostics, see users/memory.py - at /ht/memory/ for internal services
+# signal starting tracemalloc, then writing reports to LOG_ROOT, None to ignore it
+MEMORY_SIGNAL = 'SIGUSR2'
+# frames of traceback kept per allocation
+MEMORY_TRACE_FRAMES = 10
+
+# threads running requests per project/asgi.py process
+ASGI_THREADS = 16
+
+# validate the login & register requests without instantiating their
+# serializers, see users/views/validation.py
+FAST_REQUEST_VALIDATION = True
+
+# password hashing pool, see users/hashing.py
+# number of hashing processes - 0 hashes in the request thread
+PASSWORD_HASHING_WORKERS = 2
+# jobs allowed to wait for a free process, more are rejected with 503
+PASSWORD_HASHING_MAX_PENDING = 16
+# seconds a request may wait for a slot before the 503, 0 rejects at once
+PASSWORD_HASHING_QUEUE_TIMEOUT = 0
+
+# token buckets, see users/ratelimit.py
+# group: {scope: (burst capacity, seconds per refilled token)}
+RATE_LIMITS = {
+    # step 1 of RegisterView, PhoneCodeLoginView & SetPasswordByPhoneCodeView
+    'sms_code': {
+        'phone': (3, 60),
+        'ip': (20, 6),
+        'global': (200, 0.02),
+    },
+    # step 2 of RegisterView - verification code guesses
+    'verify_code': {
+        'phone': (5, 60),
+        'ip': (30, 6),
+    },
+}
+# buckets each worker keeps while redis is unavailable
+RATE_LIMIT_LOCAL_MAXSIZE = 100000
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.DeviceSessionAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -21,10 +21,13 @@ from django.contrib import admin
 from django.conf import settings
 from django.views.static import serve
 from django.conf.urls.static import static
+from users.views import MemoryDiagnosticsView, metrics_export
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
+    path('ht/metrics/', metrics_export, name='metrics'),
+    path('ht/memory/', MemoryDiagnosticsView.as_view(), name='memory'),
     path('ht/', include('health_check.urls')),
 ]
 
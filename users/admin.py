@@ -1,11 +1,155 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from .models.user import User
 
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
 
-class UserAdmin(UserAdmin):
+
+def estimate_row_count(model, using='default'):
+    """
+    Row count of `model`'s table from the database statistics, no scan
+
+    Return None when the backend keeps no such statistics.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ('SELECT TABLE_ROWS FROM information_schema.TABLES '
+               'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s')
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator skipping the exact `COUNT(*)` of big tables
+
+    Unfiltered querysets are counted from the table statistics once these
+    report more than `estimate_threshold` rows, filtered ones are counted
+    up to `count_limit` rows only.
+    """
+    estimate_threshold = 100000
+    count_limit = 10000
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        count = queryset[:self.count_limit].count()
+        self.estimated = count >= self.count_limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paging with `?after=<pk>` / `?before=<pk>` instead of OFFSET
+
+    Rows are always ordered by descending primary key, so every page is a
+    range scan of the primary key, however deep the admin pages.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = self._pk_param(request, AFTER_VAR)
+        self.before = self._pk_param(request, BEFORE_VAR)
+        super(KeysetChangeList, self).__init__(request, *args, **kwargs)
+
+    @staticmethod
+    def _pk_param(request, name):
+        try:
+            return int(request.GET[name])
+        except (KeyError, ValueError):
+            return None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(KeysetChangeList, self).get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # filter and search links start over from the first page
+        remove = list(remove or [])
+        new_params = new_params or {}
+        remove += [name for name in (AFTER_VAR, BEFORE_VAR) if name not in new_params]
+        return super(KeysetChangeList, self).get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        size = self.list_per_page
+        if self.before is not None:
+            rows = list(self.queryset.filter(pk__gt=self.before).order_by('pk')[:size + 1])
+            has_previous, has_next = len(rows) > size, True
+            rows = rows[:size][::-1]
+        else:
+            queryset = self.queryset
+            if self.after is not None:
+                queryset = queryset.filter(pk__lt=self.after)
+            rows = list(queryset[:size + 1])
+            has_previous, has_next = self.after is not None, len(rows) > size
+            rows = rows[:size]
+
+        self.result_count = paginator.count
+        self.estimated_count = getattr(paginator, 'estimated', False)
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = paginator
+        self.keyset = True
+        self.previous_url = self.next_url = None
+        if rows and has_previous:
+            self.previous_url = self.get_query_string({BEFORE_VAR: rows[0].pk})
+        if rows and has_next:
+            self.next_url = self.get_query_string({AFTER_VAR: rows[-1].pk})
+
+
+class LargeTableAdminMixin(object):
+    """
+    ModelAdmin changelist for tables too big to COUNT(*) or page with OFFSET
+
+    Set USER_ADMIN_LARGE_TABLE = False to get Django's default changelist.
+    """
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        if getattr(settings, 'USER_ADMIN_LARGE_TABLE', True):
+            return KeysetChangeList
+        return super(LargeTableAdminMixin, self).get_changelist(request, **kwargs)
+
+
+class UserAdmin(LargeTableAdminMixin, UserAdmin):
     list_display = ['id', 'phone', 'verified', 'verified_ts']
+    # phone prefix search - LIKE 'xxx%' uses the unique index on phone
+    search_fields = ['^phone']
+    # indexed columns only, see User.Meta.indexes
+    list_filter = ['verified', 'verified_ts']
+    ordering = ['-id']
     readonly_fields = ['date_joined', 'last_login', 'verified_ts', 'updated']
     fieldsets = [
         (None, {
@@ -30,4 +174,11 @@ class UserAdmin(UserAdmin):
                 'fields': ['username', 'phone', 'password1', 'password2']})
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        # phones are stored in E.164 - search '186 0000' as '+861860000'
+        search_term = search_term.strip()
+        if search_term and not search_term.startswith('+'):
+            search_term = '+86' + search_term.replace(' ', '')
+        return super(UserAdmin, self).get_search_results(request, queryset, search_term)
+
 admin.site.register(User, UserAdmin)
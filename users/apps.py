@@ -5,3 +5,8 @@ from django.utils.translation import ugettext_lazy as _
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = _('USERS')
+
+    def ready(self):
+        from . import signals, writebehind  # noqa: F401
+        from .memory import install_signal_handler
+        install_signal_handler()
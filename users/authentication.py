@@ -0,0 +1,258 @@
+"""
+Cache backed token authentication
+
+DRF's TokenAuthentication runs one `authtoken_token JOIN users_user` query
+for every authenticated request. `CachedTokenAuthentication` resolves the
+token through two cache tiers before falling back to the database:
+
+    1. a small in-process LRU with a short TTL
+    2. the shared django-redis cache
+
+`DeviceSessionAuthentication` is the flavour reading the per-device
+sessions of `users.models.DeviceSession`.
+
+Entries are dropped by the handlers in `users.signals` when a session or
+token is deleted - logout, kick out, the user deleted - and when the
+user is saved.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import DEFERRED
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# written over dropped entries, see TokenCache
+TOMBSTONE = 'dropped'
+
+
+class LocalLRUCache(object):
+    """
+    Thread-safe in-process cache with a maximum size and a per-entry TTL
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.timeout:
+            return None
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.timeout:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def dump(instance):
+    """The field values of a model instance, as cached"""
+    return {field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields}
+
+
+def load(model, fields):
+    """A new instance of `model` from `dump` output"""
+    return model.from_db(DEFAULT_DB_ALIAS, None, [
+        fields.get(field.attname, DEFERRED) for field in model._meta.concrete_fields])
+
+
+class TokenCache(object):
+    """
+    Two tier token cache: local LRU in front of the shared cache
+
+    Tokens and users are cached apart, as copies of their fields: every
+    request gets instances of its own, and a saved user drops one entry
+    whatever the number of its tokens.
+
+    An entry is dropped by writing a tombstone over it, right away and
+    again once the transaction commits. Entries are only `add`ed, so a
+    request which read the row before the change can't cache it again;
+    the request finding a tombstone removes it before reading the row.
+
+    A failing shared cache is a miss: the request reads the database.
+    """
+    prefix = 'auth-token:'
+    user_prefix = 'auth-user:'
+
+    def __init__(self):
+        self.local = LocalLRUCache(
+            getattr(settings, 'TOKEN_CACHE_LOCAL_MAXSIZE', 10000),
+            getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 5))
+        self.timeout = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300)
+
+    def get(self, key, model):
+        """A new instance of the token of `key`, with its user, or None"""
+        token_key = self.prefix + key
+        token = self.local.get(token_key)
+        if token is not None:
+            user = self.local.get(self.user_prefix + str(token['user_id']))
+            if user is not None:
+                metrics.inc('cache_requests_total', cache='token-local', result='hit')
+                return self.load(model, token, user)
+
+        try:
+            token = self._get_shared(token_key)
+            user = token and self._get_shared(self.user_prefix + str(token['user_id']))
+        except Exception as e:
+            log.warning("Token cache unavailable: %s", e)
+            metrics.inc('cache_requests_total', cache='token-shared', result='error')
+            return None
+        metrics.inc('cache_requests_total', cache='token-shared',
+                    result='miss' if user is None else 'hit')
+        if user is None:
+            return None
+        self.local.set(token_key, token)
+        self.local.set(self.user_prefix + str(token['user_id']), user)
+        return self.load(model, token, user)
+
+    @staticmethod
+    def _get_shared(cache_key):
+        value = cache.get(cache_key)
+        if value == TOMBSTONE:
+            cache.delete(cache_key)
+            return None
+        return value
+
+    @staticmethod
+    def load(model, token, user):
+        token = load(model, token)
+        token.user = load(model._meta.get_field('user').related_model, user)
+        return token
+
+    def set(self, key, token):
+        """Cache a token and its user read from the database"""
+        entries = [(self.prefix + key, dump(token)),
+                   (self.user_prefix + str(token.user_id), dump(token.user))]
+        for cache_key, fields in entries:
+            try:
+                added = cache.add(cache_key, fields, self.timeout)
+            except Exception as e:
+                log.warning("Token cache unavailable: %s", e)
+                return
+            if added:
+                self.local.set(cache_key, fields)
+
+    def delete(self, keys):
+        """Drop tokens - revoked, deleted"""
+        self._drop([self.prefix + key for key in keys])
+
+    def delete_user(self, user_id):
+        """Drop the copy of a user its tokens share - the user changed"""
+        self._drop([self.user_prefix + str(user_id)])
+
+    def _drop(self, cache_keys):
+        if not cache_keys:
+            return
+
+        def drop():
+            for cache_key in cache_keys:
+                self.local.delete(cache_key)
+            try:
+                cache.set_many(dict.fromkeys(cache_keys, TOMBSTONE), self.timeout)
+            except Exception as e:
+                log.error("Dropping cached tokens failed, they stay valid for up to "
+                          "%d seconds: %s", self.timeout, e)
+
+        drop()
+        # a request may have read, and cached, the rows before the commit
+        transaction.on_commit(drop)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for `rest_framework.authentication.TokenAuthentication`
+
+    Clients keep sending `Authorization: Token <key>`.
+    """
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        token = token_cache.get(key, model)
+        if token is None:
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                token = self.get_from_primary(model, key)
+            token_cache.set(key, token)
+
+        self.check_token(token)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+    def get_from_primary(self, model, key):
+        """
+        A token missing on a read replica may just not be replicated yet -
+        check the primary before rejecting it
+        """
+        if router.db_for_read(model) == DEFAULT_DB_ALIAS:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        try:
+            return model.objects.db_manager(DEFAULT_DB_ALIAS).select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def check_token(self, token):
+        """Hook for extra checks on a resolved token"""
+        pass
+
+
+class DeviceSessionAuthentication(CachedTokenAuthentication):
+    """
+    Authenticates against the per-device sessions - one token per device
+    """
+
+    def get_model(self):
+        from .models import DeviceSession
+        return DeviceSession
+
+    def check_token(self, session):
+        now = timezone.now()
+        if session.expires <= now:
+            raise exceptions.AuthenticationFailed(_('Token expired.'))
+        from .writebehind import last_seen_buffer
+        last_seen_buffer.record(session.key, now)
+
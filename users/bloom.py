@@ -0,0 +1,212 @@
+"""
+Bloom filter of verified phones
+
+Register step 1 and the logins look users up by phone, and much of that
+traffic is for phones nobody registered. `phone_bloom.might_contain` says
+for sure when a phone is not among the verified ones, without a query:
+
+    - the filter is a bitmap in redis, shared by every worker
+    - each process keeps a copy, refreshed every PHONE_BLOOM_REFRESH_INTERVAL
+      seconds; a phone the copy knows is answered locally, a phone it
+      doesn't know is checked against redis, as it may be newer than the copy
+    - phones are added by the `post_save` handler in `users.signals`;
+      `manage.py rebuild_phone_bloom` recreates the bitmap from the table.
+      Code verifying users without `save()` - `bulk_create`,
+      `queryset.update(verified=True)` - must call `phone_bloom.add_many`
+    - a phone that couldn't be added would be a false negative, so a
+      failed add turns the filter off, every phone "might" be registered,
+      until the next rebuild
+
+Set PHONE_BLOOM_ENABLED = False to turn it off. Until the first rebuild,
+or while redis is unavailable, every phone "might" be registered and the
+callers query the database as before.
+
+PHONE_BLOOM_CAPACITY and PHONE_BLOOM_ERROR_RATE size the bitmap: about
+17 MB for 10 million phones at 0.1% false positives, in redis and
+in every process.
+"""
+import hashlib
+import logging
+import math
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+class PhoneBloomFilter(object):
+    """
+    :param capacity: number of phones expected
+    :param error_rate: false positive rate at `capacity` phones
+    :param refresh_interval: seconds between refreshes of the local copy
+    """
+    # v2: E.164 phones
+    key = 'users:bloom:phones:v2'
+
+    def __init__(self, capacity, error_rate, refresh_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        # optimal size & number of hashes for the capacity and error rate
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = int(math.ceil(bits / 8)) * 8
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._local = None
+        self._refreshed = None
+        # the ':ready' value of the local copy - a rebuild changes it
+        self._ready = None
+        # the ':ready' value at the last failed add, None if none failed
+        self._invalid_ready = None
+        self._lock = threading.Lock()
+
+    def positions(self, phone):
+        # double hashing: the i-th position is h1 + i * h2
+        digest = hashlib.md5(phone.encode()).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    @staticmethod
+    def set_bits(bitmap, positions):
+        # same bit order as redis SETBIT: bit 0 is the high bit of byte 0
+        for pos in positions:
+            bitmap[pos >> 3] |= 0x80 >> (pos & 7)
+
+    @staticmethod
+    def has_bits(bitmap, positions):
+        return all(bitmap[pos >> 3] & (0x80 >> (pos & 7)) for pos in positions)
+
+    def add(self, phone):
+        self.add_many([phone])
+
+    def add_many(self, phones):
+        if not settings.PHONE_BLOOM_ENABLED or not phones:
+            return
+        positions = [pos for phone in phones for pos in self.positions(phone)]
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for pos in positions:
+                pipe.setbit(self.key, pos, 1)
+            pipe.execute()
+        except Exception as e:
+            log.warning("Adding phones to the bloom filter failed: %s", e)
+            self.invalidate()
+            return
+        local = self._local
+        if local is not None:
+            self.set_bits(local, positions)
+
+    def invalidate(self):
+        """Answer "might" for every phone until the next rebuild"""
+        with self._lock:
+            # this process, even if redis can't be told
+            self._invalid_ready = self._ready
+            self._local = None
+            self._refreshed = time.monotonic()
+        try:
+            get_redis().delete(self.key + ':ready')
+        except Exception as e:
+            log.error("Turning the bloom filter off failed, run rebuild_phone_bloom: %s", e)
+
+    def might_contain(self, phone):
+        """False if the phone surely isn't verified, True if it may be"""
+        if not settings.PHONE_BLOOM_ENABLED:
+            return True
+        positions = self.positions(phone)
+        try:
+            local = self.get_local()
+            if local is None:
+                metrics.inc('phone_bloom_checks_total', result='not-built')
+                return True
+            if self.has_bits(local, positions):
+                metrics.inc('phone_bloom_checks_total', result='maybe')
+                return True
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.get(self.key + ':ready')
+            for pos in positions:
+                pipe.getbit(self.key, pos)
+            ready, *bits = pipe.execute()
+            # not ready: turned off since the local copy was taken
+            found = not ready or all(bits)
+        except Exception as e:
+            log.warning("Bloom filter unavailable: %s", e)
+            metrics.inc('phone_bloom_checks_total', result='unavailable')
+            return True
+        metrics.inc('phone_bloom_checks_total', result='maybe' if found else 'absent')
+        return found
+
+    def get_local(self):
+        """The local copy, None while the filter isn't built"""
+        now = time.monotonic()
+        if self._refreshed is None or now - self._refreshed >= self.refresh_interval:
+            with self._lock:
+                if self._refreshed is None or now - self._refreshed >= self.refresh_interval:
+                    self._refreshed = now
+                    self._local = self._fetch()
+        return self._local
+
+    def _fetch(self):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.get(self.key + ':ready')
+        pipe.get(self.key)
+        ready, bitmap = pipe.execute()
+        self._ready = ready
+        if not ready or bitmap is None or ready == self._invalid_ready:
+            return None
+        bitmap = bytearray(bitmap)
+        # redis trims the bitmap after the highest bit set
+        bitmap.extend(bytes(self.size // 8 - len(bitmap)))
+        return bitmap
+
+    def rebuild(self, phones):
+        """
+        Replace the filter with one of `phones`, an iterable
+
+        Built in memory, then swapped in atomically. Return the count.
+        """
+        bitmap = bytearray(self.size // 8)
+        count = 0
+        for phone in phones:
+            self.set_bits(bitmap, self.positions(phone))
+            count += 1
+        connection = get_redis()
+        connection.set(self.key + ':building', bytes(bitmap))
+        pipe = connection.pipeline()
+        pipe.rename(self.key + ':building', self.key)
+        # a new value each time - processes which failed to add wait for it
+        pipe.set(self.key + ':ready', repr(time.time()))
+        pipe.execute()
+        self._refreshed = None
+        return count
+
+    def stats(self):
+        """Sizing and, when built, fill and current false positive rate"""
+        stats = dict(capacity=self.capacity, error_rate=self.error_rate,
+                     bits=self.size, bytes=self.size // 8, hashes=self.hashes)
+        try:
+            connection = get_redis()
+            if connection.get(self.key + ':ready'):
+                ones = connection.bitcount(self.key)
+                fill = ones / self.size
+                stats['bits_set'] = ones
+                stats['estimated_phones'] = int(
+                    -self.size / self.hashes * math.log(1 - fill)) if fill < 1 else None
+                stats['false_positive_rate'] = fill ** self.hashes
+        except Exception as e:
+            log.warning("Bloom filter unavailable: %s", e)
+        return stats
+
+
+phone_bloom = PhoneBloomFilter(
+    capacity=settings.PHONE_BLOOM_CAPACITY,
+    error_rate=settings.PHONE_BLOOM_ERROR_RATE,
+    refresh_interval=settings.PHONE_BLOOM_REFRESH_INTERVAL)
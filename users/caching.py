@@ -0,0 +1,89 @@
+"""
+Per-user response cache
+
+`UserResponseCache` keeps the serialized data of a per-user read endpoint
+in the shared cache, stamped with the version (`User.updated`) it was
+built from; an entry of another version is a miss. The same version
+gives the ETag, so a client revalidating an unchanged resource gets its
+304 before anything is looked up or serialized, see
+`users.views.base.CachedUserResponseMixin`.
+
+Entries are dropped by the `post_save` handler in `users.signals`.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import metrics
+
+
+class UserResponseCache(object):
+    """
+    :param name: unique name of the endpoint, part of the cache keys
+    """
+    # every cache, so a saved user can be dropped from all of them
+    instances = []
+
+    # seconds a worker may hold the lock while building an entry
+    lock_timeout = 10
+    # how long, and how often, others wait for that entry
+    wait_timeout = 1.0
+    wait_interval = 0.05
+
+    def __init__(self, name):
+        self.name = name
+        self.instances.append(self)
+
+    def key(self, user_id):
+        return 'user-response:%s:%s' % (self.name, user_id)
+
+    @staticmethod
+    def stamp(version):
+        return version.isoformat()
+
+    def etag(self, user_id, version):
+        value = '%s:%s:%s' % (self.name, user_id, self.stamp(version))
+        return '"%s"' % hashlib.md5(value.encode()).hexdigest()
+
+    def get_or_set(self, user_id, version, build):
+        """
+        Return the data cached for `version`, else `build()` it
+
+        Only one worker builds a missing entry, the others wait for it
+        for `wait_timeout` seconds before building it themselves.
+        """
+        key = self.key(user_id)
+        stamp = self.stamp(version)
+        data = self._get(key, stamp)
+        metrics.inc('cache_requests_total', cache='response:' + self.name,
+                    result='miss' if data is None else 'hit')
+        if data is not None:
+            return data
+
+        if cache.add(key + ':lock', 1, self.lock_timeout):
+            try:
+                data = build()
+                cache.set(key, (stamp, data), settings.USER_RESPONSE_CACHE_TIMEOUT)
+            finally:
+                cache.delete(key + ':lock')
+            return data
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            data = self._get(key, stamp)
+            if data is not None:
+                return data
+        return build()
+
+    def _get(self, key, stamp):
+        entry = cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        return None
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cache.delete_many([instance.key(user_id) for instance in cls.instances])
@@ -0,0 +1,176 @@
+"""
+Password hashing service
+
+PBKDF2 is pure CPU work holding the GIL for tens of milliseconds, so hashing
+inside the request thread starves every other request on the same worker.
+`PasswordHashingService` runs `make_password` / `check_password` in a
+process pool instead, with a bounded number of in-flight jobs: once all
+slots are taken a request fails fast with `HashingServiceBusy`, which the
+API views turn into a 503 response.
+
+Use the module level `set_password` / `check_password` helpers in views,
+they behave like `User.set_password` / `User.check_password`.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+log = logging.getLogger(__name__)
+
+
+class HashingServiceBusy(Exception):
+    """All hashing slots are taken"""
+
+
+def init_worker():
+    # processes started with `spawn` (OS X) don't inherit the loaded apps
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _make_password(raw_password):
+    start = time.perf_counter()
+    encoded = hashers.make_password(raw_password)
+    return encoded, time.perf_counter() - start
+
+
+def _check_password(raw_password, encoded):
+    start = time.perf_counter()
+    valid = hashers.check_password(raw_password, encoded)
+    return valid, time.perf_counter() - start
+
+
+class PasswordHashingService(object):
+    """
+    Runs password hashing in a bounded process pool
+
+    :param workers: number of hashing processes, 0 hashes in the calling thread
+    :param max_pending: number of jobs allowed to wait for a free process
+    :param queue_timeout: seconds to wait for a slot before giving up
+    """
+
+    def __init__(self, workers, max_pending, queue_timeout=0):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._stats = dict(completed=0, rejected=0, pool_restarts=0,
+                           wait_seconds=0.0, hash_seconds=0.0,
+                           max_wait_seconds=0.0, max_hash_seconds=0.0)
+
+    def _get_executor(self):
+        # created lazily and per process - never share a pool across a fork
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=init_worker)
+                    self._executor_pid = pid
+        return self._executor
+
+    def _submit(self, func, *args):
+        """
+        Run `func` in the pool - a new one if a process of the pool died,
+        which breaks it for good
+        """
+        executor = self._get_executor()
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                # unless another thread replaced it already
+                if self._executor is executor:
+                    log.error("A password hashing process died, starting a new pool")
+                    self._executor = None
+                    self._stats['pool_restarts'] += 1
+            executor.shutdown(wait=False)
+            return self._get_executor().submit(func, *args).result()
+
+    def _run(self, func, *args):
+        if self.queue_timeout:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashingServiceBusy()
+
+        start = time.perf_counter()
+        try:
+            if self.workers:
+                result, hash_seconds = self._submit(func, *args)
+            else:
+                result, hash_seconds = func(*args)
+        finally:
+            self._slots.release()
+
+        wait_seconds = max(time.perf_counter() - start - hash_seconds, 0.0)
+        with self._lock:
+            stats = self._stats
+            stats['completed'] += 1
+            stats['wait_seconds'] += wait_seconds
+            stats['hash_seconds'] += hash_seconds
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], wait_seconds)
+            stats['max_hash_seconds'] = max(stats['max_hash_seconds'], hash_seconds)
+        return result
+
+    def make_password(self, raw_password):
+        return self._run(_make_password, raw_password)
+
+    def check_password(self, raw_password, encoded):
+        return self._run(_check_password, raw_password, encoded)
+
+    def stats(self):
+        """Return counters: queue wait versus hash time, in seconds"""
+        with self._lock:
+            return dict(self._stats)
+
+
+hashing_service = PasswordHashingService(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 16),
+    queue_timeout=getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', 0))
+
+
+def make_password(raw_password):
+    """Same as `django.contrib.auth.hashers.make_password`, hashing in the pool"""
+    return hashing_service.make_password(raw_password)
+
+
+def set_password(user, raw_password):
+    """Same as `User.set_password`, hashing in the pool - doesn't save the user"""
+    if raw_password:
+        user.password = hashing_service.make_password(raw_password)
+        user._password = raw_password
+
+
+def check_password(user, raw_password):
+    """
+    Same as `User.check_password`, hashing in the pool
+
+    Upgrades the stored hash, like Django does, when the hasher settings
+    changed since it was created.
+    """
+    if not user.password:
+        return True
+    valid = hashing_service.check_password(raw_password, user.password)
+    if valid and hashers.is_password_usable(user.password):
+        preferred = hashers.get_hasher('default')
+        hasher = hashers.identify_hasher(user.password)
+        if (hasher.algorithm != preferred.algorithm or
+                preferred.must_update(user.password)):
+            set_password(user, raw_password)
+            user.save(update_fields=['password'])
+    return valid
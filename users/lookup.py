@@ -0,0 +1,85 @@
+"""
+Batch user lookup for internal services
+
+`lookup_users` resolves many ids and phones at once: a cache multi-get,
+then a single `WHERE id IN (...) OR phone IN (...)` query for whatever
+the cache missed. Found records are cached for USER_LOOKUP_CACHE_TIMEOUT
+seconds and dropped when the user is saved or deleted, see `users.signals`.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+
+from .metrics import metrics
+
+UserModel = get_user_model()
+
+FIELDS = ('id', 'phone', 'verified', 'verified_ts', 'is_active', 'created')
+
+
+def _id_key(user_id):
+    return 'user-lookup:id:%s' % user_id
+
+
+def _phone_key(phone):
+    return 'user-lookup:phone:%s' % phone
+
+
+def lookup_users(ids=(), phones=()):
+    """
+    Resolve users by id and by (normalized) phone
+
+    :return: `(by_id, by_phone)`, dicts with the record of every value,
+        or None for unknown users
+    """
+    records = _cached_records(ids, phones)
+    metrics.inc('cache_requests_total', len(records), cache='user-lookup', result='hit')
+
+    missing_ids = [user_id for user_id in ids if user_id not in records]
+    missing_phones = [phone for phone in phones if phone not in records]
+    if missing_ids or missing_phones:
+        metrics.inc('cache_requests_total', len(missing_ids) + len(missing_phones),
+                    cache='user-lookup', result='miss')
+        query = Q(pk__in=missing_ids) | Q(phone__in=missing_phones)
+        entries = {}
+        for record in UserModel.objects.filter(query).values(*FIELDS):
+            records[record['id']] = entries[_id_key(record['id'])] = record
+            if record['phone']:
+                records[record['phone']] = record
+                entries[_phone_key(record['phone'])] = record['id']
+        cache.set_many(entries, settings.USER_LOOKUP_CACHE_TIMEOUT)
+
+    by_id = {user_id: records.get(user_id) for user_id in ids}
+    by_phone = {phone: records.get(phone) for phone in phones}
+    return by_id, by_phone
+
+
+def _cached_records(ids, phones):
+    """
+    Records of the cache, by id and by phone
+
+    The cache maps ids to records and phones to ids: saving a user drops
+    its id entry, so a phone moving on from a user can't leave an out of
+    date record behind.
+    """
+    keys = [_id_key(user_id) for user_id in ids] + [_phone_key(phone) for phone in phones]
+    found = cache.get_many(keys)
+    pointers = {phone: found[_phone_key(phone)] for phone in phones
+                if _phone_key(phone) in found}
+    more = [_id_key(user_id) for user_id in set(pointers.values())
+            if _id_key(user_id) not in found]
+    if more:
+        found.update(cache.get_many(more))
+
+    records = {user_id: found[_id_key(user_id)] for user_id in ids
+               if _id_key(user_id) in found}
+    for phone, user_id in pointers.items():
+        record = found.get(_id_key(user_id))
+        if record is not None and record['phone'] == phone:
+            records[phone] = record
+    return records
+
+
+def invalidate(user):
+    cache.delete(_id_key(user.pk))
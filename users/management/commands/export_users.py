@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import export
+
+
+class Command(BaseCommand):
+    help = 'Stream all users as CSV or JSON lines, to stdout or a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='file to write, default: stdout')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--after-id', type=int, default=0,
+                            help='resume after this user id')
+        for name in export.RANGE_FILTERS:
+            parser.add_argument('--' + name.replace('_', '-'), dest=name,
+                                help='ISO date or datetime')
+
+    def handle(self, *args, **options):
+        try:
+            filters = export.parse_filters(options)
+        except ValueError as e:
+            raise CommandError('Invalid date %s' % e)
+
+        rows = export.iter_users(filters, options['batch_size'], options['after_id'])
+        lines = export.render(rows, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,162 @@
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from sms import PHONE_REGEX
+from users.bloom import phone_bloom
+from users.hashing import init_worker
+from users.phones import normalize_phone, phone_key, to_e164
+
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Import users from a CSV (with a header row) or JSONL file. '
+            'Records need a `phone` and may have a `password`.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='default: guessed from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='processes hashing passwords')
+        parser.add_argument('--verified', action='store_true',
+                            help='mark imported users as verified')
+        parser.add_argument('--checkpoint',
+                            help='progress file, default: <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true',
+                            help='ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        batch_size = options['batch_size']
+        self.verified = options['verified']
+        self.stats = dict(read=0, inserted=0, duplicate=0, invalid=0)
+
+        done = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write('Resuming after record %d' % done)
+
+        if not os.path.exists(path):
+            raise CommandError('%s does not exist' % path)
+
+        executor = None
+        if options['workers'] > 1:
+            executor = ProcessPoolExecutor(options['workers'], initializer=init_worker)
+        self.executor = executor
+
+        start = time.monotonic()
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                records = self.read_records(f, fmt)
+                records = islice(records, done, None)
+                while True:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+                    done += len(batch)
+                    self.write_checkpoint(checkpoint, done)
+                    self.report(start)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS('Done - ' + self.report(start, write=False)))
+        os.remove(checkpoint)
+
+    def read_records(self, f, fmt):
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def import_batch(self, batch):
+        self.stats['read'] += len(batch)
+        records = {}
+        for record in batch:
+            phone = normalize_phone(record.get('phone') or '')
+            if not re.match(PHONE_REGEX, phone):
+                self.stats['invalid'] += 1
+                continue
+            phone = to_e164(phone)
+            if phone in records:
+                self.stats['duplicate'] += 1
+                continue
+            records[phone] = record.get('password') or ''
+
+        try:
+            self.insert(records)
+        except IntegrityError:
+            # a phone was registered meanwhile - dedupe again and retry
+            self.insert(records)
+
+    def insert(self, records):
+        existing = set(UserModel.objects.filter(phone__in=list(records))
+                       .values_list('phone', flat=True))
+        phones = [phone for phone in records if phone not in existing]
+        duplicates = len(records) - len(phones)
+
+        # hash the provided passwords in parallel, keep '' for none
+        with_password = [phone for phone in phones if records[phone]]
+        hashed = dict(zip(with_password, self.hash_passwords(
+            [records[phone] for phone in with_password])))
+
+        now = timezone.now()
+        users = [UserModel(username=phone, phone=phone, phone_key=phone_key(phone),
+                           password=hashed.get(phone, ''),
+                           verified=self.verified,
+                           verified_ts=now if self.verified else None)
+                 for phone in phones]
+        with transaction.atomic():
+            UserModel.objects.bulk_create(users)
+        if self.verified:
+            # bulk_create sends no post_save
+            phone_bloom.add_many(phones)
+        self.stats['duplicate'] += duplicates
+        self.stats['inserted'] += len(users)
+
+    def hash_passwords(self, passwords):
+        if self.executor is None:
+            return map(make_password, passwords)
+        chunksize = max(len(passwords) // (self.executor._max_workers * 4), 1)
+        return self.executor.map(make_password, passwords, chunksize=chunksize)
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as f:
+                return json.load(f)['done']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, done):
+        tmp = checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'done': done}, f)
+        os.replace(tmp, checkpoint)
+
+    def report(self, start, write=True):
+        elapsed = max(time.monotonic() - start, 1e-6)
+        msg = ('%(read)d read, %(inserted)d inserted, %(duplicate)d duplicate, '
+               '%(invalid)d invalid' % self.stats)
+        msg += ' - %.0f rows/sec' % (self.stats['read'] / elapsed)
+        if write:
+            self.stdout.write(msg)
+        return msg
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users import profiler
+
+FORMATS = ('folded', 'speedscope')
+
+
+class Command(BaseCommand):
+    help = 'Add up the sampled profiles of all workers, for a flame graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='file to write, default: stdout')
+        parser.add_argument('--format', choices=FORMATS, default='folded',
+                            help='folded for flamegraph.pl, speedscope for speedscope.app')
+        parser.add_argument('--view', help='URL name of the requests, default: all')
+        parser.add_argument('--minutes', type=float,
+                            help='only the profiles of the last minutes')
+        parser.add_argument('--directory', default=settings.PROFILER_DIR)
+
+    def handle(self, *args, **options):
+        since = time.time() - options['minutes'] * 60 if options['minutes'] else None
+        stacks, files = profiler.read_profiles(options['directory'], options['view'], since)
+        if not files:
+            raise CommandError('No profiles in %s' % options['directory'])
+
+        if options['format'] == 'speedscope':
+            lines = profiler.render_speedscope(stacks, options['view'] or 'all views',
+                                               settings.PROFILER_INTERVAL)
+        else:
+            lines = profiler.render_folded(stacks)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        self.stderr.write('%d profiles, %d samples' % (files, sum(stacks.values())))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users import profiler
+
+
+class Command(BaseCommand):
+    help = ('Print a token profiling the requests which carry it in X-Profile-Token, '
+            'valid PROFILER_TOKEN_MAX_AGE seconds')
+
+    def handle(self, *args, **options):
+        self.stdout.write(profiler.make_token())
+        self.stderr.write('valid %d seconds' % settings.PROFILER_TOKEN_MAX_AGE)
@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from users.models import DeviceSession, SMSOutbox
+
+UserModel = get_user_model()
+
+
+def stale_users():
+    """Phones that never finished the registration"""
+    cutoff = timezone.now() - timedelta(days=settings.PURGE_UNVERIFIED_AFTER_DAYS)
+    return UserModel.objects.filter(verified=False, created__lt=cutoff,
+                                    is_staff=False, is_superuser=False)
+
+
+def expired_sessions():
+    return DeviceSession.objects.filter(expires__lt=timezone.now())
+
+
+def orphaned_tokens():
+    """DRF tokens without a device session - sessions replaced them"""
+    sessions = DeviceSession.objects.filter(key=OuterRef('key'))
+    return Token.objects.annotate(has_session=Exists(sessions)).filter(has_session=False)
+
+
+def old_messages():
+    """Text messages sent or given up on"""
+    cutoff = timezone.now() - timedelta(days=settings.SMS_OUTBOX_KEEP_DAYS)
+    return SMSOutbox.objects.filter(status__in=[SMSOutbox.SENT, SMSOutbox.FAILED],
+                                    created__lt=cutoff)
+
+
+PURGES = [
+    ('users', stale_users),
+    ('sessions', expired_sessions),
+    ('tokens', orphaned_tokens),
+    ('outbox', old_messages),
+]
+
+
+class Command(BaseCommand):
+    help = ('Delete unverified users older than PURGE_UNVERIFIED_AFTER_DAYS, '
+            'expired device sessions, orphaned DRF tokens and SMS outbox messages '
+            'older than SMS_OUTBOX_KEEP_DAYS, in small chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='rows per DELETE statement')
+        parser.add_argument('--sleep', type=float, default=0.5,
+                            help='seconds between two chunks, lets the replicas catch up')
+        parser.add_argument('--only', action='append', choices=[name for name, _ in PURGES],
+                            help='purge only these, repeatable')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='count the rows, delete nothing')
+        parser.add_argument('--every', type=float,
+                            help='run forever, purging every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            for name, queryset in PURGES:
+                if not options['only'] or name in options['only']:
+                    self.purge(name, queryset, options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def purge(self, name, get_queryset, options):
+        """
+        Delete the rows of `get_queryset()` in primary key order, chunk by chunk
+
+        Every chunk is selected afresh by primary key range and deleted by
+        primary key, so no statement scans or locks more than one chunk.
+        The delete keeps the stale predicate: a row which stopped being
+        stale in between, e.g. a user who just verified, stays.
+        """
+        chunk_size = options['chunk_size']
+        start = time.monotonic()
+        total = 0
+        last_pk = None
+        while True:
+            queryset = get_queryset().order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            if options['dry_run']:
+                total += len(pks)
+            else:
+                queryset = get_queryset()
+                _count, deleted = queryset.filter(pk__in=pks).delete()
+                total += deleted.get(queryset.model._meta.label, 0)
+            if len(pks) < chunk_size:
+                break
+            time.sleep(options['sleep'])
+
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write('%s: %d %s in %.1f seconds - %.0f rows/sec' % (
+            name, total, 'to delete' if options['dry_run'] else 'deleted',
+            elapsed, total / elapsed))
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.bloom import phone_bloom
+
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the bloom filter of verified phones from the users table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--stats', action='store_true',
+                            help='only report the size and fill of the filter')
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            started = timezone.now()
+            start = time.monotonic()
+            count = phone_bloom.rebuild(self.verified_phones(options['batch_size']))
+            # phones verified while the bitmap was built went to the old one
+            for phone in self.verified_phones(options['batch_size'],
+                                              verified_ts__gte=started):
+                phone_bloom.add(phone)
+            self.stdout.write('%d phones in %.1f seconds' % (count, time.monotonic() - start))
+
+        for name, value in sorted(phone_bloom.stats().items()):
+            self.stdout.write('%s: %s' % (name, value))
+
+    def verified_phones(self, batch_size, **filters):
+        """All verified phones, one batch of ids at a time"""
+        queryset = UserModel.objects.filter(verified=True, phone__isnull=False, **filters)
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'phone')[:batch_size])
+            for _id, phone in rows:
+                yield phone
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
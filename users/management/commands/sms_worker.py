@@ -0,0 +1,64 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import SMSOutbox
+from users.providers import get_provider
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Deliver the text messages queued in the SMS outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='messages claimed per round trip')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='exit once no message is due')
+
+    def handle(self, *args, **options):
+        while True:
+            claimed = self.dispatch_batch(options['batch_size'])
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
+
+    def dispatch_batch(self, batch_size):
+        """
+        Send one batch of due messages, return the number claimed
+
+        Every message is marked sent as soon as the provider took it, so
+        one the lease expired on is never sent twice; the batch stops at
+        the end of the lease, leaving the rest to the next claim.
+        """
+        messages = SMSOutbox.objects.claim(batch_size, settings.SMS_OUTBOX_LEASE)
+        provider = get_provider()
+        sent = failed = 0
+        for msg in messages:
+            # next_attempt is the end of our lease
+            if timezone.now() >= msg.next_attempt:
+                log.warning("SMS outbox lease expired, %d messages left to another claim",
+                            len(messages) - sent - failed)
+                break
+            try:
+                succeed, err_msg = provider.send(msg.phone, msg.message)
+            except Exception as e:
+                log.exception("SMS provider error")
+                succeed, err_msg = False, str(e)
+            if succeed:
+                msg.mark_sent()
+                sent += 1
+            else:
+                msg.mark_failed(err_msg)
+                failed += 1
+
+        if messages:
+            log.info("SMS outbox batch: %d sent, %d failed", sent, failed)
+        return len(messages)
@@ -0,0 +1,175 @@
+"""
+Worker memory diagnostics
+
+Reports what a worker process holds, without restarting it:
+
+    - the objects of the types listed in `tracked_types` - serializers,
+      tokens, sessions, users - and the most common types overall, from
+      the garbage collector
+    - the size of the in-process caches
+    - with tracemalloc tracing, the top allocation sites, as a diff
+      against the baseline snapshot when there is one
+
+Tracing costs memory and CPU, so it runs only between `start` and `stop`:
+take a baseline, let the worker serve for a while, then report what grew.
+Ask for it at `/ht/memory/`, see `users.views.memory`, or send the worker
+MEMORY_SIGNAL: the first signal starts tracing with a baseline, the next
+ones write a report to LOG_ROOT/memory.<pid>.<timestamp>.json.
+"""
+import gc
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework.serializers import BaseSerializer
+
+from .authentication import token_cache
+from .models import DeviceSession
+
+log = logging.getLogger(__name__)
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+_lock = threading.Lock()
+_baseline = None
+
+
+def tracked_types():
+    """Labels and classes of the objects counted - subclasses included"""
+    return [
+        ('serializers', BaseSerializer),
+        ('tokens', Token),
+        ('device_sessions', DeviceSession),
+        ('users', get_user_model()),
+    ]
+
+
+def start(frames=None):
+    """Start tracing, if need be, and take a new baseline"""
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or settings.MEMORY_TRACE_FRAMES)
+        _baseline = _snapshot()
+
+
+def stop():
+    global _baseline
+    with _lock:
+        _baseline = None
+        tracemalloc.stop()
+
+
+def _snapshot():
+    # leave out what tracemalloc itself allocates
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ])
+
+
+def object_counts(limit):
+    """Objects of the tracked types, and the `limit` most common types"""
+    tracked = tracked_types()
+    # unreachable cycles aren't held
+    gc.collect()
+    types = Counter(type(obj) for obj in gc.get_objects())
+
+    counts = dict.fromkeys((label for label, _cls in tracked), 0)
+    for cls, count in types.items():
+        for label, tracked_cls in tracked:
+            if issubclass(cls, tracked_cls):
+                counts[label] += count
+    common = [(cls.__qualname__ if cls.__module__ == 'builtins'
+               else '%s.%s' % (cls.__module__, cls.__qualname__), count)
+              for cls, count in types.most_common(limit)]
+    return counts, common
+
+
+def allocations(limit, group_by):
+    """Top allocation sites, against the baseline when there is one"""
+    with _lock:
+        if not tracemalloc.is_tracing():
+            return None
+        baseline = _baseline
+        snapshot = _snapshot()
+    if baseline is not None:
+        stats = snapshot.compare_to(baseline, group_by)
+    else:
+        stats = snapshot.statistics(group_by)
+    sites = []
+    for stat in stats[:limit]:
+        site = {
+            'size': stat.size,
+            'count': stat.count,
+            'traceback': ['%s:%d' % (frame.filename, frame.lineno) for frame in stat.traceback],
+        }
+        if baseline is not None:
+            site['size_diff'] = stat.size_diff
+            site['count_diff'] = stat.count_diff
+        sites.append(site)
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'baseline': baseline is not None,
+        'traced_bytes': current,
+        'traced_peak_bytes': peak,
+        'overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+        'sites': sites,
+    }
+
+
+def report(limit=20, group_by='lineno'):
+    objects, types = object_counts(limit)
+    return {
+        'pid': os.getpid(),
+        'time': time.time(),
+        'tracing': tracemalloc.is_tracing(),
+        'objects': objects,
+        'types': types,
+        'caches': {
+            'token_local': {'size': len(token_cache.local),
+                            'maxsize': token_cache.local.maxsize},
+        },
+        'allocations': allocations(limit, group_by),
+    }
+
+
+def write_report():
+    path = os.path.join(settings.LOG_ROOT, 'memory.%d.%d.json' % (os.getpid(), time.time()))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(report(), f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def _on_signal():
+    try:
+        if not tracemalloc.is_tracing():
+            start()
+            log.warning("Memory tracing started with a baseline, pid %d", os.getpid())
+        else:
+            log.warning("Memory report written to %s", write_report())
+    except Exception:
+        log.exception("Memory diagnostics failed")
+
+
+def install_signal_handler():
+    """Answer MEMORY_SIGNAL, from the main thread only"""
+    if not settings.MEMORY_SIGNAL:
+        return
+    try:
+        # the work runs in a thread - not in the middle of whatever the
+        # signal interrupted, which may hold locks it needs
+        signal.signal(getattr(signal, settings.MEMORY_SIGNAL),
+                      lambda signum, frame: threading.Thread(target=_on_signal).start())
+    except ValueError:
+        # not the main thread: the server installs its own handlers
+        pass
@@ -0,0 +1,368 @@
+"""
+Request metrics, exported in the Prometheus text format
+
+`MetricsMiddleware` records per view - the URL name - the latency
+histogram, the responses per status, and the DB queries and their time;
+`BaseAPIView` adds the APIError codes, the caches their hits and misses.
+
+Every thread records into dicts of its own, so the request path takes
+no lock. Each process writes the sum of its threads to METRICS_DIR/<pid>.json
+every METRICS_FLUSH_INTERVAL seconds; `/ht/metrics/` merges the files
+of all worker processes. The counters of processes which exited are kept,
+folded into one file, so totals never go down.
+
+Set METRICS_ENABLED = False to record nothing.
+"""
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'users_'
+
+# upper bounds of the latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# merged counters of exited processes
+EXITED = 'exited.json'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics(object):
+    """
+    Counters and histograms of the process
+
+    :param directory: where the processes write their snapshots
+    :param flush_interval: seconds between two snapshots of a process
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        # name, type and help of every metric
+        self.types = {}
+        # callables returning samples of the process: (name, labels, value)
+        self.collectors = []
+        self._local = threading.local()
+        self._stores = []
+        self._pid = None
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+
+    def declare(self, name, kind, help_text):
+        """`kind` is 'counter', 'gauge' or 'histogram'"""
+        self.types[name] = (kind, help_text)
+
+    def _store(self):
+        pid = os.getpid()
+        store = getattr(self._local, 'store', None)
+        if store is None or store[0] != pid:
+            if self._pid != pid:
+                # forked: don't count the parent's numbers again
+                self._stores, self._pid = [], pid
+            store = self._local.store = (pid, {}, {})
+            self._stores.append(store)
+        return store
+
+    def inc(self, name, value=1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        counters = self._store()[1]
+        key = _key(name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        histograms = self._store()[2]
+        key = _key(name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # a count per bucket, +Inf included, then the sum
+            histogram = histograms[key] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect.bisect_left(BUCKETS, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        """The numbers of the process, in the format of the files"""
+        counters, histograms = {}, {}
+        for _pid, thread_counters, thread_histograms in list(self._stores):
+            # dict.copy() is atomic, the owner thread may be writing
+            for key, value in thread_counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, values in thread_histograms.copy().items():
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(list(values)):
+                    total[i] += value
+        gauges = []
+        for collector in self.collectors:
+            try:
+                gauges.extend(collector())
+            except Exception:
+                log.exception("Metrics collector %r failed", collector)
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, values]
+                           for (name, labels), values in histograms.items()],
+            'gauges': gauges,
+        }
+
+    def flush(self):
+        """Write the snapshot of the process"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '%d.json' % os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        # one thread flushes, the others go on
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning("Writing the metrics failed: %s", e)
+            finally:
+                self._flush_lock.release()
+
+    def collect(self):
+        """
+        Merge the snapshots of all processes, in the format of the files
+
+        Snapshots of exited processes are folded into EXITED, gauges
+        of the living ones only are kept.
+        """
+        self.flush()
+        # one exporter at a time folds the exited processes
+        with open(os.path.join(self.directory, 'collect.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._collect()
+
+    def _collect(self):
+        exited_path = os.path.join(self.directory, EXITED)
+        exited = _load(exited_path) or {'counters': [], 'histograms': []}
+        merged = {'counters': [], 'histograms': [], 'gauges': []}
+        folded = []
+        for path in glob.glob(os.path.join(self.directory, '[0-9]*.json')):
+            pid = int(os.path.basename(path).split('.')[0])
+            data = _load(path)
+            if data is None:
+                continue
+            if _alive(pid):
+                for kind in merged:
+                    merged[kind].extend(data[kind])
+            else:
+                exited['counters'].extend(data['counters'])
+                exited['histograms'].extend(data['histograms'])
+                folded.append(path)
+        exited = _sum(exited)
+        if folded:
+            with open(exited_path + '.tmp', 'w') as f:
+                json.dump(exited, f)
+            os.replace(exited_path + '.tmp', exited_path)
+            for path in folded:
+                os.remove(path)
+        merged['counters'] += exited['counters']
+        merged['histograms'] += exited['histograms']
+        return _sum(merged)
+
+    def render(self):
+        """All processes, in the Prometheus text format"""
+        data = self.collect()
+        samples = {}
+        for kind in ('counters', 'gauges', 'histograms'):
+            for name, labels, value in data[kind]:
+                samples.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(samples):
+            kind, help_text = self.types.get(name, ('untyped', ''))
+            full_name = PREFIX + name
+            lines.append('# HELP %s %s' % (full_name, help_text))
+            lines.append('# TYPE %s %s' % (full_name, kind))
+            for labels, value in sorted(samples[name], key=lambda sample: sample[0]):
+                if kind != 'histogram':
+                    lines.append('%s%s %s' % (full_name, _labels(labels), _number(value)))
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value):
+                    cumulative += count
+                    lines.append('%s_bucket%s %s' % (
+                        full_name, _labels(labels + [['le', str(bound)]]), cumulative))
+                lines.append('%s_sum%s %s' % (full_name, _labels(labels), _number(value[-1])))
+                lines.append('%s_count%s %s' % (full_name, _labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # gone, or being replaced
+        return None
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sum(data):
+    """Add up the samples of the same name and labels"""
+    result = {}
+    for kind, samples in data.items():
+        totals = {}
+        for name, labels, value in samples:
+            key = (name, tuple(map(tuple, labels)))
+            if kind == 'histograms':
+                total = totals.setdefault(key, [0] * len(value))
+                for i, count in enumerate(value):
+                    total[i] += count
+            else:
+                totals[key] = totals.get(key, 0) + value
+        result[kind] = [[name, [list(label) for label in labels], value]
+                        for (name, labels), value in totals.items()]
+    return result
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ['%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                            .replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels]
+    return '{%s}' % ','.join(escaped)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+metrics.declare('http_requests_total', 'counter', 'Responses by view, method and status.')
+metrics.declare('http_request_duration_seconds', 'histogram', 'Request latency by view and method.')
+metrics.declare('api_errors_total', 'counter', 'APIError responses by view and error code.')
+metrics.declare('db_queries_total', 'counter', 'Queries by view and database.')
+metrics.declare('db_query_seconds_total', 'counter', 'Query time by view and database.')
+metrics.declare('cache_requests_total', 'counter', 'Cache lookups by cache and result.')
+metrics.declare('password_hashing_total', 'counter', 'Password hashing jobs by result.')
+metrics.declare('password_hashing_seconds_total', 'counter',
+                'Password hashing time, waiting for a slot or hashing.')
+metrics.declare('writebehind_total', 'counter', 'Write-behind buffer events by buffer.')
+metrics.declare('writebehind_pending', 'gauge', 'Values waiting in write-behind buffers.')
+metrics.declare('replica_healthy', 'gauge', 'Whether the replica passes the lag check, per process.')
+metrics.declare('phone_bloom_checks_total', 'counter', 'Phone bloom filter answers.')
+
+
+def process_stats():
+    """Samples of the counters the other modules keep"""
+    from .routers import _replica_health
+    from .writebehind import buffers
+
+    # not imported here: the flush at exit can't import concurrent.futures.process
+    hashing = sys.modules.get(__package__ + '.hashing')
+    if hashing is not None:
+        stats = hashing.hashing_service.stats()
+        yield ['password_hashing_total', [['result', 'completed']], stats['completed']]
+        yield ['password_hashing_total', [['result', 'rejected']], stats['rejected']]
+        yield ['password_hashing_seconds_total', [['phase', 'wait']], stats['wait_seconds']]
+        yield ['password_hashing_seconds_total', [['phase', 'hash']], stats['hash_seconds']]
+    for buffer in buffers:
+        stats = buffer.stats()
+        name = '%s.%s' % (buffer.model_label, buffer.field)
+        for event in ('recorded', 'flushed', 'flushes', 'errors'):
+            yield ['writebehind_total', [['buffer', name], ['event', event]], stats[event]]
+        yield ['writebehind_pending', [['buffer', name]], stats['pending']]
+    for alias, (_checked, healthy) in list(_replica_health.items()):
+        yield ['replica_healthy', [['alias', alias], ['pid', str(os.getpid())]], int(healthy)]
+
+
+metrics.collectors.append(process_stats)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # unresolved paths share one label - no label per 404 URL
+    return match.view_name if match is not None else '<unresolved>'
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency, status and queries of every request
+
+    Put it first in MIDDLEWARE, to time the whole stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = {}
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                alias = context['connection'].alias
+                count, seconds = queries.get(alias, (0, 0.0))
+                queries[alias] = (count + 1, seconds + time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = view_name(request)
+        metrics.observe('http_request_duration_seconds', duration,
+                        view=view, method=request.method)
+        metrics.inc('http_requests_total', view=view, method=request.method,
+                    status=str(response.status_code))
+        for alias, (count, seconds) in queries.items():
+            metrics.inc('db_queries_total', count, view=view, database=alias)
+            metrics.inc('db_query_seconds_total', seconds, view=view, database=alias)
+        metrics.maybe_flush()
+        return response
+
+
+def flush_at_exit():
+    if settings.METRICS_ENABLED and metrics._stores:
+        try:
+            metrics.flush()
+        except OSError as e:
+            log.warning("Writing the metrics failed: %s", e)
+
+
+atexit.register(flush_at_exit)
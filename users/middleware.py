@@ -0,0 +1,85 @@
+"""
+Middleware profiles
+
+Django runs every request through all of MIDDLEWARE. The token
+authenticated endpoints under /api/ use none of the browser machinery -
+sessions, CSRF, messages, `request.user`, X-Frame-Options - so that part
+of the stack, FULL_PROFILE_MIDDLEWARE, is run by `ProfileMiddleware` for
+the paths outside API_PROFILE_PREFIXES only: the admin, /ht/, the docs.
+
+`request.profile` tells which profile a request got. On the API profile
+the API views authenticate with API_PROFILE_AUTHENTICATION_CLASSES, see
+`users.views.base.BaseAPIView.get_authenticators`.
+
+Set API_PROFILE_PREFIXES = [] to run the full stack everywhere.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+API_PROFILE = 'api'
+FULL_PROFILE = 'full'
+
+
+def get_profile(request):
+    return getattr(request, 'profile', FULL_PROFILE)
+
+
+class ProfileMiddleware(object):
+    """
+    Runs FULL_PROFILE_MIDDLEWARE, hooks included, as Django would at this
+    position of MIDDLEWARE - unless the path is an API profile one
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.API_PROFILE_PREFIXES)
+        self.view_hooks = []
+        self.template_response_hooks = []
+        self.exception_hooks = []
+
+        # the same chain as BaseHandler.load_middleware
+        handler = get_response
+        for path in reversed(settings.FULL_PROFILE_MIDDLEWARE):
+            try:
+                middleware = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, 'process_view'):
+                self.view_hooks.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self.template_response_hooks.append(middleware.process_template_response)
+            if hasattr(middleware, 'process_exception'):
+                self.exception_hooks.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+        self.full_stack = handler
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.prefixes):
+            request.profile = API_PROFILE
+            return self.get_response(request)
+        request.profile = FULL_PROFILE
+        return self.full_stack(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if get_profile(request) == FULL_PROFILE:
+            for hook in self.view_hooks:
+                response = hook(request, view_func, view_args, view_kwargs)
+                if response:
+                    return response
+        return None
+
+    def process_template_response(self, request, response):
+        if get_profile(request) == FULL_PROFILE:
+            for hook in self.template_response_hooks:
+                response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if get_profile(request) == FULL_PROFILE:
+            for hook in self.exception_hooks:
+                response = hook(request, exception)
+                if response:
+                    return response
+        return None
@@ -0,0 +1,37 @@
+# Generated by Django 2.0.1 on 2026-10-17 05:51
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=30, verbose_name='phone')),
+                ('message', models.CharField(max_length=500, verbose_name='message')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt')),
+                ('claim_id', models.CharField(blank=True, max_length=32)),
+                ('last_error', models.CharField(blank=True, max_length=255, verbose_name='last error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('sent_ts', models.DateTimeField(blank=True, null=True, verbose_name='sent timestamp')),
+            ],
+            options={
+                'verbose_name': 'SMS outbox message',
+                'verbose_name_plural': 'SMS outbox',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='smsoutbox',
+            index=models.Index(fields=['status', 'next_attempt'], name='users_smsou_status_da9fa0_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.0.1 on 2026-10-17 05:55
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_tokens(apps, schema_editor):
+    """Keep logged in clients logged in: one session per DRF token"""
+    Token = apps.get_model('authtoken', 'Token')
+    DeviceSession = apps.get_model('users', 'DeviceSession')
+    db_alias = schema_editor.connection.alias
+    expires = django.utils.timezone.now() + timedelta(
+        seconds=settings.DEVICE_SESSION_TIMEOUT)
+    batch = []
+    for key, user_id, created in Token.objects.using(db_alias).values_list(
+            'key', 'user_id', 'created').iterator():
+        batch.append(DeviceSession(key=key, user_id=user_id,
+                                   last_seen=created, expires=expires))
+        if len(batch) >= 1000:
+            DeviceSession.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    DeviceSession.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_smsoutbox'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceSession',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='key')),
+                ('device_id', models.CharField(blank=True, max_length=64, verbose_name='device id')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='last seen')),
+                ('expires', models.DateTimeField(db_index=True, verbose_name='expires')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_sessions', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'Device session',
+                'verbose_name_plural': 'Device sessions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='devicesession',
+            index=models.Index(fields=['user', 'device_id'], name='users_devic_user_id_048b00_idx'),
+        ),
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
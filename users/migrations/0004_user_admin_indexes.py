@@ -0,0 +1,21 @@
+# Generated by Django 2.0.1 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_devicesession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['verified'], name='users_user_verifie_1ff25d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['verified_ts'], name='users_user_verifie_5fb2ab_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.0.1 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='phone key'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['phone_key', 'verified'], name='users_user_phone_k_af80f3_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+import logging
+
+from django.db import migrations, models
+
+from users.phones import phone_key, to_e164
+
+BATCH_SIZE = 1000
+
+log = logging.getLogger(__name__)
+
+
+def backfill_phones(apps, schema_editor):
+    """
+    Store phones in E.164 and fill phone_key, BATCH_SIZE users at a time
+
+    When several users share a phone in different formats, a verified one
+    gets it - the oldest of them - else the oldest one; the others keep
+    their phone unchanged and no phone_key, to be merged by hand.
+    """
+    User = apps.get_model('users', 'User')
+    users = User.objects.using(schema_editor.connection.alias)
+    skipped = []
+    # the verified users first, so they own their phones
+    for verified in (True, False):
+        skipped.extend(convert(users, users.filter(verified=verified)))
+    if skipped:
+        log.warning("Users with a duplicate phone, not converted: %s", skipped)
+
+
+def convert(users, selected):
+    """Convert the phones of `selected` users, return the ids of the duplicates"""
+    last_id = 0
+    skipped = []
+    while True:
+        rows = list(selected.filter(id__gt=last_id, phone__isnull=False)
+                    .order_by('id').values_list('id', 'phone')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        canonical = {user_id: to_e164(phone) for user_id, phone in rows}
+        owners = dict(users.filter(phone__in=set(canonical.values()))
+                      .values_list('phone', 'id'))
+        updates = {}
+        for user_id, phone in canonical.items():
+            owner = owners.setdefault(phone, user_id)
+            if owner == user_id:
+                updates[user_id] = phone
+            else:
+                skipped.append(user_id)
+        if updates:
+            users.filter(id__in=list(updates)).update(
+                phone=models.Case(*[models.When(id=user_id, then=models.Value(phone))
+                                    for user_id, phone in updates.items()],
+                                  output_field=models.CharField()),
+                phone_key=models.Case(*[models.When(id=user_id, then=models.Value(phone_key(phone)))
+                                        for user_id, phone in updates.items()],
+                                      output_field=models.BigIntegerField()))
+    return skipped
+
+
+class Migration(migrations.Migration):
+    # every batch commits on its own - no transaction around the whole table
+    atomic = False
+
+    dependencies = [
+        ('users', '0005_phone_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_phones, migrations.RunPython.noop),
+    ]
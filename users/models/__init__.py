@@ -1 +1,3 @@
 from .user import User
+from .outbox import SMSOutbox
+from .session import DeviceSession
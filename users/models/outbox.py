@@ -0,0 +1,88 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+
+class SMSOutboxManager(models.Manager):
+    def enqueue(self, phone, message):
+        return self.create(phone=phone, message=message)
+
+    def claim(self, batch_size, lease):
+        """
+        Claim up to `batch_size` due messages for one worker
+
+        Claimed rows are pushed `lease` seconds into the future, so other
+        workers skip them - and pick them up again if this worker dies.
+        """
+        now = timezone.now()
+        due = self.filter(status=self.model.PENDING, next_attempt__lte=now)
+        ids = list(due.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        claim_id = uuid.uuid4().hex
+        due.filter(id__in=ids).update(
+            claim_id=claim_id, next_attempt=now + timedelta(seconds=lease))
+        return list(self.filter(id__in=ids, claim_id=claim_id).order_by('id'))
+
+
+class SMSOutbox(models.Model):
+    """
+    Text messages waiting for delivery
+
+    Rows are inserted by the API views and delivered by the `sms_worker`
+    management command. The text, which holds verification codes, is
+    cleared once a message is sent or given up on, and `purge_stale`
+    deletes those rows after SMS_OUTBOX_KEEP_DAYS.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _('pending')),
+        (SENT, _('sent')),
+        (FAILED, _('failed')),
+    ]
+
+    phone = models.CharField(_('phone'), max_length=30)
+    message = models.CharField(_('message'), max_length=500)
+    status = models.CharField(_('status'), max_length=10,
+                              choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    next_attempt = models.DateTimeField(_('next attempt'), default=timezone.now)
+    claim_id = models.CharField(max_length=32, blank=True)
+    last_error = models.CharField(_('last error'), max_length=255, blank=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    sent_ts = models.DateTimeField(_('sent timestamp'), null=True, blank=True)
+    objects = SMSOutboxManager()
+
+    def retry_delay(self):
+        """Exponential backoff: base, 2 * base, 4 * base... capped"""
+        delay = settings.SMS_OUTBOX_RETRY_DELAY * 2 ** max(self.attempts - 1, 0)
+        return min(delay, settings.SMS_OUTBOX_RETRY_MAX_DELAY)
+
+    def mark_sent(self):
+        self.status = self.SENT
+        self.sent_ts = timezone.now()
+        self.message = ''
+        self.save(update_fields=['status', 'sent_ts', 'message'])
+
+    def mark_failed(self, err_msg):
+        self.attempts += 1
+        self.last_error = (err_msg or '')[:255]
+        if self.attempts >= settings.SMS_OUTBOX_MAX_ATTEMPTS:
+            self.status = self.FAILED
+            self.message = ''
+        else:
+            self.next_attempt = timezone.now() + timedelta(seconds=self.retry_delay())
+        self.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt', 'message'])
+
+    class Meta:
+        verbose_name = _('SMS outbox message')
+        verbose_name_plural = _('SMS outbox')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
@@ -0,0 +1,77 @@
+import binascii
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+
+class DeviceSessionManager(models.Manager):
+    def start(self, user, device_id=''):
+        """
+        Log the user in on a device - replaces the device's previous session
+
+        Sessions without a device id are never replaced, they just expire.
+        """
+        if device_id:
+            self.revoke(self.filter(user=user, device_id=device_id))
+        return self.create(user=user, device_id=device_id)
+
+    def revoke_all(self, user):
+        """Log the user out of all devices"""
+        self.revoke(self.filter(user=user))
+
+    def revoke(self, queryset):
+        """
+        Delete the sessions of `queryset`
+
+        Their cached copies are dropped by the `post_delete` handler in
+        `users.signals`, whatever deletes them.
+        """
+        queryset.delete()
+
+
+class DeviceSession(models.Model):
+    """
+    A logged in device of a user
+
+    `key` is the token clients send in the `Authorization: Token <key>`
+    header, see `users.authentication.DeviceSessionAuthentication`.
+    """
+    key = models.CharField(_('key'), max_length=40, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='device_sessions',
+                             verbose_name=_('user'))
+    device_id = models.CharField(_('device id'), max_length=64, blank=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    last_seen = models.DateTimeField(_('last seen'), default=timezone.now)
+    expires = models.DateTimeField(_('expires'), db_index=True)
+    objects = DeviceSessionManager()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        if not self.expires:
+            self.expires = timezone.now() + timedelta(
+                seconds=settings.DEVICE_SESSION_TIMEOUT)
+        return super(DeviceSession, self).save(*args, **kwargs)
+
+    @staticmethod
+    def generate_key():
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @property
+    def expired(self):
+        return self.expires <= timezone.now()
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = _('Device session')
+        verbose_name_plural = _('Device sessions')
+        indexes = [
+            models.Index(fields=['user', 'device_id']),
+        ]
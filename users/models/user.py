@@ -3,11 +3,21 @@ from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from ..phones import phone_key, to_e164
+
 
 class UserManager(UserManager):
     def create_by_phone(self, phone, **kwargs):
+        phone = to_e164(phone)
         return self.create_user(phone, phone=phone, **kwargs)
 
+    def by_phone(self, phone):
+        """Users of `phone`, in any format, through the phone_key index"""
+        key = phone_key(to_e164(phone))
+        if key is None:
+            return self.none()
+        return self.filter(phone_key=key)
+
 
 class User(AbstractUser):
     """
@@ -18,6 +28,9 @@ class User(AbstractUser):
     phone = models.CharField(_('phone'), max_length=30, unique=True,
                              null=True, blank=True,
                              help_text=_('Mobile phone number'))
+    # digits of `phone` - with `verified` the index of the phone logins
+    phone_key = models.BigIntegerField(_('phone key'), null=True, blank=True,
+                                       editable=False)
     created = models.DateTimeField(_('created'), auto_now_add=True)
     updated = models.DateTimeField(_('last update'), auto_now=True)
     verified = models.BooleanField(
@@ -27,6 +40,12 @@ class User(AbstractUser):
                                        null=True, blank=True)
     objects = UserManager()
 
+    def save(self, *args, **kwargs):
+        if self.phone:
+            self.phone = to_e164(self.phone)
+        self.phone_key = phone_key(self.phone)
+        super(User, self).save(*args, **kwargs)
+
     def mark_verified(self):
         self.verified = True
         self.verified_ts = timezone.now()
@@ -44,3 +63,9 @@ class User(AbstractUser):
     class Meta:
         verbose_name = _('User')
         verbose_name_plural = _('Users')
+        # admin list filters, see users.admin.UserAdmin
+        indexes = [
+            models.Index(fields=['phone_key', 'verified']),
+            models.Index(fields=['verified']),
+            models.Index(fields=['verified_ts']),
+        ]
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class IsInternalService(BasePermission):
+    """
+    Requests of our own services, sending one of INTERNAL_SERVICE_KEYS
+    in the `X-Service-Key` header
+    """
+    message = 'Invalid service key.'
+
+    def has_permission(self, request, view):
+        key = request.META.get('HTTP_X_SERVICE_KEY')
+        if not key:
+            return False
+        # compare with every key, so timing doesn't tell which one is close
+        matches = [constant_time_compare(key, valid)
+                   for valid in settings.INTERNAL_SERVICE_KEYS.values()]
+        return any(matches)
@@ -0,0 +1,51 @@
+"""
+Phone number helpers
+
+Phones are stored in E.164 ('+8618600001111'), whatever format they were
+entered in, together with `phone_key`, the number's digits as an integer
+(8618600001111) - the compact key the login lookups go through.
+"""
+import re
+
+_formatting_re = re.compile(r'[\s\-().]')
+_e164_re = re.compile(r'^\+\d{1,15}$')
+_country_prefixes = ('+86', '0086', '86')
+
+
+def normalize_phone(value):
+    """
+    Strip formatting from a Chinese mobile number
+
+    Removes spaces, dashes, dots and parentheses and the +86 / 0086 / 86
+    country prefix: '+86 186-0000-1111' -> '18600001111'
+    """
+    phone = _formatting_re.sub('', str(value))
+    for prefix in _country_prefixes:
+        if phone.startswith(prefix) and len(phone) - len(prefix) == 11:
+            return phone[len(prefix):]
+    return phone
+
+
+def to_e164(value):
+    """
+    Canonical form of a phone: '186 0000 1111' -> '+8618600001111'
+
+    Chinese mobile numbers get the +86 prefix, numbers already in E.164
+    are kept, anything else is only stripped of formatting.
+    """
+    phone = normalize_phone(value)
+    if len(phone) == 11 and phone.isdigit():
+        return '+86' + phone
+    return phone
+
+
+def to_national(phone):
+    """'+8618600001111' -> '18600001111', for the Chinese SMS gateways"""
+    return normalize_phone(phone)
+
+
+def phone_key(phone):
+    """Integer of an E.164 phone's digits, None for other values"""
+    if phone and _e164_re.match(phone):
+        return int(phone[1:])
+    return None
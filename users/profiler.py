@@ -0,0 +1,185 @@
+"""
+Sampling profiler
+
+`SamplingProfilerMiddleware` profiles the requests which carry a valid
+X-Profile-Token header - a signed token of `manage.py profiler_token` -
+and a PROFILER_SAMPLE_RATE share of the others, 0 by default: nothing
+is profiled unless asked for.
+
+While such a request runs, a thread of its own looks at the stack of
+the request thread every PROFILER_INTERVAL seconds, so the code profiled
+runs unchanged - no tracing hook, no per-call cost. The stacks counted
+are written in the collapsed format of flamegraph.pl, one
+`frame;frame;frame count` line per stack, to
+PROFILER_DIR/<view>.<pid>.<timestamp>.folded. `manage.py merge_profiles`
+adds up the files of all workers, as collapsed stacks or a speedscope
+profile.
+"""
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+
+from .metrics import view_name
+
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+SALT = 'users.profiler'
+
+SUFFIX = '.folded'
+
+
+def make_token():
+    """A token profiling the requests carrying it, for PROFILER_TOKEN_MAX_AGE"""
+    return signing.dumps('profile', salt=SALT)
+
+
+def valid_token(token):
+    try:
+        return signing.loads(token, salt=SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def frame_name(frame):
+    return '%s:%s' % (frame.f_globals.get('__name__', '?'), frame.f_code.co_name)
+
+
+class Sampler(object):
+    """
+    Counts the stacks of a thread, sampled from another
+
+    :param thread_id: `threading.get_ident()` of the thread profiled
+    :param interval: seconds between two samples
+    :param root: code object where the stacks stop, the profiler's caller
+    """
+
+    def __init__(self, thread_id, interval, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        # 'frame;frame;frame', root first: samples
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame.f_code is not self.root:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+        os.replace(path + '.tmp', path)
+
+
+class SamplingProfilerMiddleware(object):
+    """
+    Profiles the URL resolution and the view of requests which ask for it
+
+    Put it last in MIDDLEWARE. The response of a profiled request has the
+    name of its file in X-Profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+
+        root = SamplingProfilerMiddleware.__call__.__code__
+        with Sampler(threading.get_ident(), settings.PROFILER_INTERVAL, root) as sampler:
+            response = self.get_response(request)
+        name = '%s.%d.%d%s' % (re.sub(r'[^\w.-]', '_', view_name(request)), os.getpid(),
+                               time.time() * 1000, SUFFIX)
+        sampler.write(os.path.join(settings.PROFILER_DIR, name))
+        response['X-Profile'] = name
+        return response
+
+    def wanted(self, request):
+        token = request.META.get(HEADER)
+        if token is not None:
+            return valid_token(token)
+        rate = settings.PROFILER_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+
+def read_profiles(directory, view=None, since=None):
+    """
+    Add up the collapsed stacks of PROFILER_DIR
+
+    :param view: the URL name of the requests profiled, default: all
+    :param since: timestamp, skip the profiles older
+    :return: ({stack: samples}, number of files)
+    """
+    pattern = '%s.*%s' % (re.sub(r'[^\w.-]', '_', view) if view else '*', SUFFIX)
+    stacks, files = {}, 0
+    for path in glob.glob(os.path.join(directory, pattern)):
+        if since is not None and os.path.getmtime(path) < since:
+            continue
+        files += 1
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] = stacks.get(stack, 0) + int(count)
+    return stacks, files
+
+
+def render_folded(stacks):
+    for stack, count in sorted(stacks.items()):
+        yield '%s %d\n' % (stack, count)
+
+
+def render_speedscope(stacks, name, interval):
+    """A sampled profile of https://www.speedscope.app, weighed in seconds"""
+    frames, indexes, samples, weights = [], {}, [], []
+    for stack, count in sorted(stacks.items()):
+        sample = []
+        for frame in stack.split(';'):
+            if frame not in indexes:
+                indexes[frame] = len(frames)
+                frames.append({'name': frame})
+            sample.append(indexes[frame])
+        samples.append(sample)
+        weights.append(count * interval)
+    yield json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'name': name,
+        'exporter': 'users.profiler',
+    })
@@ -0,0 +1,98 @@
+"""
+SMS providers
+
+A provider delivers one text message to one phone. The provider in use is
+selected by `settings.SMS_PROVIDER`.
+"""
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .phones import to_national
+
+log = logging.getLogger(__name__)
+
+
+class BaseSMSProvider(object):
+    """Override `send`"""
+
+    def send(self, phone, message):
+        """
+        Deliver `message` to `phone`
+
+        :return: (succeed, err_msg) tuple
+        """
+        raise NotImplementedError
+
+
+class DummyProvider(BaseSMSProvider):
+    """Logs messages instead of sending them - for development"""
+
+    def send(self, phone, message):
+        log.info("SMS to %s: %s", phone, message)
+        return True, ''
+
+
+class LocalProvider(BaseSMSProvider):
+    """
+    Stand-in provider for tests and load tests - no network access
+
+    Sent messages are kept in `sent`. SMS_LOCAL_DELAY (seconds) simulates a
+    slow gateway and SMS_LOCAL_FAILURE_RATE (0 - 1) a flaky one.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, phone, message):
+        delay = getattr(settings, 'SMS_LOCAL_DELAY', 0)
+        if delay:
+            time.sleep(delay)
+        if random.random() < getattr(settings, 'SMS_LOCAL_FAILURE_RATE', 0):
+            return False, 'simulated failure'
+        with self._lock:
+            self.sent.append((phone, message))
+        return True, ''
+
+
+class LuosimaoProvider(BaseSMSProvider):
+    """https://luosimao.com/docs/api/"""
+    timeout = 5
+
+    def send(self, phone, message):
+        auth = base64.b64encode(
+            ('api:key-%s' % settings.LUOSIMAO_API_KEY).encode()).decode()
+        data = urlencode({'mobile': to_national(phone), 'message': message}).encode()
+        request = Request(settings.LUOSIMAO_URL + 'send.json', data=data,
+                          headers={'Authorization': 'Basic ' + auth})
+        try:
+            with urlopen(request, timeout=self.timeout) as resp:
+                result = json.loads(resp.read().decode())
+        except (URLError, OSError, ValueError) as e:
+            log.warning("Luosimao request failed: %s", e)
+            return False, str(e)
+
+        if result.get('error') != 0:
+            return False, result.get('msg', '')
+        return True, ''
+
+
+_providers = {}
+
+
+def get_provider():
+    """Return the provider instance configured by `settings.SMS_PROVIDER`"""
+    path = settings.SMS_PROVIDER
+    if path not in _providers:
+        _providers[path] = import_string(path)()
+    return _providers[path]
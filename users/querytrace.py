@@ -0,0 +1,221 @@
+"""
+Query tracer
+
+The `django.db.backends` logger sees queries only while DEBUG wraps the
+cursors, and doesn't tell which view ran them. `QueryTraceMiddleware`
+wraps every connection with `execute_wrapper` instead, DEBUG or not,
+and attributes each query to the view - the URL name - of its request:
+
+    - queries are aggregated by view, database and statement, with the
+      values of IN lists collapsed, into calls, total and max time
+    - of the queries slower than QUERY_TRACE_SLOW_SECONDS, a
+      QUERY_TRACE_SAMPLE_RATE share is EXPLAINed, off the request, by a
+      thread of the process
+    - every QUERY_TRACE_SUMMARY_INTERVAL seconds that thread writes the
+      QUERY_TRACE_TOP statements by total time, with the plans sampled,
+      to LOG_ROOT/query-summary.<pid>.txt and starts a new window
+
+Off unless QUERY_TRACE_ENABLED: the middleware removes itself from the
+stack then, so it costs nothing.
+"""
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import view_name
+
+log = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+EXPLAIN = {
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+def fingerprint(sql):
+    """The statement, the same whatever the length of its IN lists"""
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+def format_plan(columns, rows):
+    lines = [' | '.join(columns)]
+    lines.extend(' | '.join(str(value) for value in row) for row in rows)
+    return '\n'.join(lines)
+
+
+class QueryTracer(object):
+    """
+    :param slow_seconds: queries this slow are sampled for EXPLAIN
+    :param sample_rate: share of the slow queries EXPLAINed (0 - 1)
+    :param summary_interval: seconds covered by a summary
+    :param top: statements in a summary
+    :param directory: where the summaries are written
+    :param background: run the EXPLAINs and summaries in a thread of the
+        process; without it, the owner calls `run_pending()`
+    """
+    # slow queries waiting for their EXPLAIN, more are dropped
+    max_pending = 100
+
+    def __init__(self, slow_seconds, sample_rate, summary_interval, top, directory,
+                 background=True):
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.summary_interval = summary_interval
+        self.top = top
+        self.directory = directory
+        self.background = background
+        # (view, alias, statement): [calls, seconds, max seconds]
+        self._stats = {}
+        # (view, alias, statement): (seconds, plan) of the slowest sample
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(self.max_pending)
+        self._thread_pid = None
+        self._window_start = time.time()
+
+    def record(self, view, alias, sql, params, seconds):
+        """Account a query; `params` is None for executemany()"""
+        key = (view, alias, fingerprint(sql))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        if self.background and self._thread_pid != os.getpid():
+            self._start()
+        if seconds >= self.slow_seconds and random.random() < self.sample_rate:
+            try:
+                self._queue.put_nowait((key, alias, sql, params, seconds))
+            except queue.Full:
+                pass
+
+    def _start(self):
+        with self._lock:
+            # per process - threads don't survive a fork
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                thread = threading.Thread(target=self.run, name='query-tracer', daemon=True)
+                thread.start()
+
+    def run(self):
+        while True:
+            timeout = self._window_start + self.summary_interval - time.time()
+            self.run_pending(max(timeout, 0))
+
+    def run_pending(self, timeout=0):
+        """
+        EXPLAIN one sampled query, waiting up to `timeout` seconds for
+        one, and write the summary when its window is over
+        """
+        try:
+            key, alias, sql, params, seconds = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            pass
+        else:
+            try:
+                self.explain(key, alias, sql, params, seconds)
+            finally:
+                if self.background:
+                    # the thread's own connection - don't keep it open
+                    # for the odd EXPLAIN
+                    connections[alias].close()
+        if time.time() >= self._window_start + self.summary_interval:
+            try:
+                self.write_summary()
+            except OSError as e:
+                log.warning("Writing the query summary failed: %s", e)
+
+    def explain(self, key, alias, sql, params, seconds):
+        connection = connections[alias]
+        prefix = EXPLAIN.get(connection.vendor)
+        if prefix is None or params is None or not sql.lstrip()[:6].upper() == 'SELECT':
+            plan = None
+        else:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(prefix + sql, params)
+                    columns = [column[0] for column in cursor.description]
+                    plan = format_plan(columns, cursor.fetchall())
+            except Exception as e:
+                plan = 'EXPLAIN failed: %s' % e
+        log.warning("Slow query in %s on %s (%.3fs): %s\n%s",
+                    key[0], alias, seconds, key[2], plan or '')
+        with self._lock:
+            if key not in self._plans or self._plans[key][0] < seconds:
+                self._plans[key] = (seconds, plan)
+
+    def write_summary(self):
+        """Write the window's top statements, start a new window"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            plans, self._plans = self._plans, {}
+            start, self._window_start = self._window_start, time.time()
+        if not stats:
+            return None
+
+        top = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)[:self.top]
+        lines = ['Queries from %s to %s, top %d of %d statements by total time' % (
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+            time.strftime('%Y-%m-%d %H:%M:%S'), len(top), len(stats))]
+        for key, (calls, seconds, slowest) in top:
+            view, alias, statement = key
+            lines.append('')
+            lines.append('%.3fs total, %d calls, %.1fms avg, %.1fms max - %s on %s' % (
+                seconds, calls, seconds / calls * 1000, slowest * 1000, view, alias))
+            lines.append('    ' + statement)
+            if plans.get(key, (0, None))[1]:
+                lines.append('    EXPLAIN (%.3fs):' % plans[key][0])
+                lines.extend('        ' + line for line in plans[key][1].splitlines())
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, 'query-summary.%d.txt' % os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+        return path
+
+
+tracer = QueryTracer(
+    slow_seconds=settings.QUERY_TRACE_SLOW_SECONDS,
+    sample_rate=settings.QUERY_TRACE_SAMPLE_RATE,
+    summary_interval=settings.QUERY_TRACE_SUMMARY_INTERVAL,
+    top=settings.QUERY_TRACE_TOP,
+    directory=settings.LOG_ROOT)
+
+
+class QueryTraceMiddleware(object):
+    """Traces the queries of every request, see module docstring"""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_TRACE_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        def trace(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                # resolved while the request runs, read at query time
+                tracer.record(view_name(request), context['connection'].alias, sql,
+                              None if many else params, time.perf_counter() - start)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(trace))
+            return self.get_response(request)
@@ -0,0 +1,173 @@
+"""
+Token bucket rate limiting
+
+A bucket holds up to `capacity` tokens and gains one every `period`
+seconds; each request takes one. Buckets live in redis (through the
+django-redis connection) so every worker shares them. When redis is not
+available we fall back to in-process buckets, which still limit each worker.
+
+The limits are grouped in `settings.RATE_LIMITS`:
+
+    RATE_LIMITS = {
+        'sms_code': {
+            'phone': (3, 60),
+            'ip': (20, 6),
+            'global': (200, 0.02),
+        },
+    }
+
+Every group is a dict of scope -> (capacity, period). Known scopes are
+'phone', 'ip' and 'global'.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super(RateLimitExceeded, self).__init__(retry_after)
+
+
+class LocalBuckets(object):
+    """
+    In-process buckets, used while redis is unavailable
+
+    Kept in least recently used order. A bucket refilled to its capacity
+    is the same as no bucket, so those are dropped, and past `maxsize`
+    the least recently used go too - the phones and IPs seen during an
+    outage don't pile up.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, 'RATE_LIMIT_LOCAL_MAXSIZE', 100000)
+        # key: (tokens, ts, time the bucket is full again)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets, now):
+        """
+        Take one token from every bucket, or from none of them
+
+        :param buckets: list of (key, capacity, period)
+        :return: 0 if allowed, else seconds until a token is available
+        """
+        with self._lock:
+            levels = []
+            retry_after = 0
+            for key, capacity, period in buckets:
+                tokens, ts, _full = self._buckets.get(key, (capacity, now, now))
+                tokens = min(capacity, tokens + (now - ts) / period)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) * period)
+                levels.append((key, capacity, period, tokens))
+            if not retry_after:
+                for key, capacity, period, tokens in levels:
+                    tokens -= 1
+                    self._buckets[key] = (tokens, now, now + (capacity - tokens) * period)
+                    self._buckets.move_to_end(key)
+            self._evict(now)
+            return retry_after
+
+    def _evict(self, now):
+        while self._buckets:
+            key, (_tokens, _ts, full) = next(iter(self._buckets.items()))
+            if full > now and len(self._buckets) <= self.maxsize:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBuckets(object):
+    """Buckets in redis - all of them checked & taken in one Lua script"""
+    script = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) / period)
+    if tokens < 1 then
+        retry_after = math.max(retry_after, (1 - tokens) * period)
+    end
+    levels[i] = tokens
+end
+if retry_after == 0 then
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local period = tonumber(ARGV[i * 2 + 1])
+        redis.call('HSET', key, 'tokens', tostring(levels[i] - 1))
+        redis.call('HSET', key, 'ts', ARGV[1])
+        redis.call('EXPIRE', key, math.ceil(capacity * period) + 1)
+    end
+end
+return tostring(retry_after)
+"""
+
+    def __init__(self):
+        self._script = None
+
+    def take(self, buckets, now):
+        from django_redis import get_redis_connection
+        connection = get_redis_connection('default')
+        if self._script is None:
+            self._script = connection.register_script(self.script)
+        args = [repr(now)]
+        for key, capacity, period in buckets:
+            args.extend([capacity, period])
+        result = self._script(keys=[key for key, _c, _p in buckets],
+                              args=args, client=connection)
+        return float(result)
+
+
+class RateLimiter(object):
+    key_prefix = 'users:rl:'
+
+    def __init__(self):
+        self.redis = RedisBuckets()
+        self.local = LocalBuckets()
+
+    def check(self, group, values):
+        """
+        Take a token from every bucket of `group`
+
+        :param values: dict of scope -> value, e.g. {'phone': '186..'}.
+            Scopes without a value, except 'global', are skipped.
+        :raise RateLimitExceeded: if any bucket is empty
+        """
+        buckets = []
+        for scope, (capacity, period) in sorted(settings.RATE_LIMITS[group].items()):
+            value = values.get(scope)
+            if scope == 'global':
+                value = scope
+            elif not value:
+                continue
+            key = '%s%s:%s:%s' % (self.key_prefix, group, scope, value)
+            buckets.append((key, capacity, period))
+        if not buckets:
+            return
+
+        now = time.time()
+        try:
+            retry_after = self.redis.take(buckets, now)
+        except Exception as e:
+            # redis is down or not the cache backend
+            log.warning("Rate limiting falls back to local buckets: %s", e)
+            retry_after = self.local.take(buckets, now)
+        if retry_after:
+            raise RateLimitExceeded(retry_after)
+
+
+rate_limiter = RateLimiter()
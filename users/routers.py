@@ -0,0 +1,181 @@
+"""
+Read replica routing
+
+`ReplicaRouter` sends the reads of a request to one of the
+DATABASE_REPLICAS, everything else stays on the primary ('default'):
+
+    - writes, `select_for_update` and reads inside a transaction
+    - reads following a write in the same request
+    - reads of users who wrote within the last REPLICA_STICKY_SECONDS,
+      so e.g. a login right after the registration sees the new user.
+      Users are told by their token, and by their phone on the login
+      path, see `pin_on_write` - never by IP, shared by whole carrier NATs
+    - reads while every replica lags more than REPLICA_MAX_LAG seconds
+
+Reads are only routed to replicas inside `replica_reads()`, which
+`ReplicaRoutingMiddleware` opens around every request; management
+commands and shells keep reading from the primary unless they ask for it.
+
+Run the tests with two SQLite databases as primary and replica:
+
+    python manage.py test users.tests.test_routers --settings=users.tests.replica_settings
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+log = logging.getLogger(__name__)
+
+_state = threading.local()
+
+# alias: (checked at, healthy), process local
+_replica_health = {}
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary, None if unknown"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SHOW SLAVE STATUS')
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = [col[0] for col in cursor.description]
+            return dict(zip(columns, row)).get('Seconds_Behind_Master')
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT COALESCE(EXTRACT(EPOCH FROM '
+                           'now() - pg_last_xact_replay_timestamp()), 0)')
+            return float(cursor.fetchone()[0])
+    # no replication to ask about, e.g. the SQLite test setup
+    return 0
+
+
+def replica_healthy(alias):
+    now = time.monotonic()
+    checked, healthy = _replica_health.get(alias, (None, False))
+    if checked is None or now - checked >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = replica_lag(alias)
+        except Exception:
+            log.exception("Checking the lag of replica %s failed", alias)
+            lag = None
+        healthy = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        if not healthy:
+            log.warning("Replica %s lags %s seconds - reading from primary", alias, lag)
+        _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+def get_replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ())
+            if alias in connections.databases]
+
+
+@contextmanager
+def replica_reads(pinned=False, pin_keys=()):
+    """
+    Route the reads of the current thread to replicas
+
+    :param pinned: read from the primary anyway, see module docstring
+    :param pin_keys: cache keys to pin should the block write
+    :return: the state, its `wrote` tells whether the block wrote
+    """
+    _state.active = True
+    _state.pinned = pinned
+    _state.pin_keys = list(pin_keys)
+    _state.wrote = False
+    _state.replica = None
+    try:
+        yield _state
+    finally:
+        _state.active = False
+
+
+def _pick_replica():
+    replica = _state.replica
+    if replica is None:
+        healthy = [alias for alias in get_replicas() if replica_healthy(alias)]
+        replica = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        _state.replica = replica
+    return replica
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        if (not getattr(_state, 'active', False) or _state.pinned or _state.wrote or
+                connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return _pick_replica()
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data
+        return True
+
+
+def token_pin_key(token):
+    return 'replica-pin:token:%s' % hashlib.sha1(token.encode()).hexdigest()
+
+
+def phone_pin_key(phone):
+    return 'replica-pin:phone:%s' % hashlib.sha1(phone.encode()).hexdigest()
+
+
+def pin_keys(request):
+    """Cache keys identifying the user: the token it sends, if any"""
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    return [token_pin_key(auth[1])] if len(auth) == 2 else []
+
+
+def pin_on_write(token=None, phone=None):
+    """
+    Pin `token` and `phone` too, should the current request write
+
+    For the users a request doesn't tell by its token yet, e.g. the new
+    token and the phone of a registration.
+    """
+    if getattr(_state, 'active', False):
+        if token:
+            _state.pin_keys.append(token_pin_key(token))
+        if phone:
+            _state.pin_keys.append(phone_pin_key(phone))
+
+
+def read_primary_if_pinned(phone):
+    """Read from the primary for the rest of the request if `phone` wrote lately"""
+    if (getattr(_state, 'active', False) and not _state.pinned and
+            cache.get(phone_pin_key(phone))):
+        _state.pinned = True
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Reads from replicas during requests, sticky to the primary after writes
+    """
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        keys = pin_keys(request)
+        pinned = bool(keys and cache.get_many(keys))
+        with replica_reads(pinned, keys) as state:
+            response = self.get_response(request)
+        if state.wrote and state.pin_keys:
+            cache.set_many(dict.fromkeys(state.pin_keys, 1), settings.REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,40 @@
+"""
+Signal handlers of the users app, connected in `UsersConfig.ready`
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .bloom import phone_bloom
+from .caching import UserResponseCache
+from .lookup import invalidate as invalidate_lookup
+from .models import DeviceSession
+
+
+@receiver(post_delete, sender=DeviceSession)
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # revoked, expired, or deleted with its user - Token for the legacy
+    # DRF tokens, when CachedTokenAuthentication is used on its own
+    token_cache.delete([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    if instance.verified and instance.phone:
+        phone_bloom.add(instance.phone)
+    # cached tokens and responses carry a copy of the user - a new user has none
+    if not created:
+        token_cache.delete_user(instance.pk)
+        UserResponseCache.invalidate(instance.pk)
+        invalidate_lookup(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    # from the admin, purge_stale - nothing may keep finding it
+    token_cache.delete_user(instance.pk)
+    UserResponseCache.invalidate(instance.pk)
+    invalidate_lookup(instance)
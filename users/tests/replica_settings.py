@@ -0,0 +1,17 @@
+"""
+Settings for users.tests.test_routers: two SQLite databases as primary
+and read replica, see users/routers.py
+"""
+from project.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'replica.sqlite3',
+    },
+}
+DATABASE_REPLICAS = ['replica']
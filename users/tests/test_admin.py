@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from users.admin import EstimatedCountPaginator, UserAdmin
+
+UserModel = get_user_model()
+
+
+class UserAdminTests(TestCase):
+
+    def setUp(self):
+        self.admin = UserModel.objects.create_superuser(
+            'admin', 'admin@example.com', 'mockedpw')
+        self.users = [UserModel.objects.create_by_phone('1890000%04d' % i)
+                      for i in range(5)]
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:users_user_changelist')
+
+    def get_ids(self, params):
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        return [user.pk for user in resp.context['cl'].result_list], resp.context['cl']
+
+    def test_keyset_pages(self):
+        ids = sorted([u.pk for u in self.users] + [self.admin.pk], reverse=True)
+        page, cl = self.get_ids({})
+        self.assertEqual(page, ids)
+        self.assertIsNone(cl.next_url)
+
+        with mock.patch.object(UserAdmin, 'list_per_page', 2):
+            page, cl = self.get_ids({})
+            self.assertEqual(page, ids[:2])
+            self.assertEqual(cl.next_url, '?after=%d' % ids[1])
+            page, cl = self.get_ids({'after': ids[1]})
+            self.assertEqual(page, ids[2:4])
+            page, cl = self.get_ids({'before': ids[2]})
+            self.assertEqual(page, ids[:2])
+            self.assertIsNone(cl.previous_url)
+
+    def test_prefix_search(self):
+        page, cl = self.get_ids({'q': '18900000003'})
+        self.assertEqual(page, [self.users[3].pk])
+        page, cl = self.get_ids({'q': '0003'})
+        self.assertEqual(page, [])
+
+    def test_capped_count(self):
+        paginator = EstimatedCountPaginator(UserModel.objects.filter(verified=False).order_by('id'), 2)
+        paginator.count_limit = 3
+        self.assertEqual(paginator.count, 3)
+        self.assertTrue(paginator.estimated)
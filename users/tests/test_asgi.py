@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from project.asgi import application, build_environ
+
+
+class AsgiApplicationTests(SimpleTestCase):
+
+    def request(self, method, path, body=b'', headers=()):
+        messages = [{'type': 'http.request', 'body': body[:3], 'more_body': True},
+                    {'type': 'http.request', 'body': body[3:]}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+            'headers': list(headers), 'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(application(scope, receive, send))
+        finally:
+            loop.close()
+        start, body = sent[0], b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertFalse(sent[-1].get('more_body', False))
+        return start['status'], dict(start['headers']), body
+
+    def test_post(self):
+        body = json.dumps({'phone': 'not a phone'}).encode()
+        status, headers, content = self.request(
+            'POST', reverse('user-register'), body,
+            [(b'content-type', b'application/json'),
+             (b'content-length', str(len(body)).encode())])
+        self.assertEqual(status, 400)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(json.loads(content.decode())['error_code'],
+                         'serializer_validation_error')
+
+    def test_not_found(self):
+        status, headers, content = self.request('GET', '/nowhere/')
+        self.assertEqual(status, 404)
+
+    def test_repeated_headers(self):
+        scope = {'type': 'http', 'method': 'GET', 'path': '/', 'headers': [
+            (b'cookie', b'sessionid=a'), (b'cookie', b'csrftoken=b'),
+            (b'accept', b'text/html'), (b'accept', b'application/json'),
+        ]}
+        environ = build_environ(scope, b'')
+        self.assertEqual(environ['HTTP_COOKIE'], 'sessionid=a; csrftoken=b')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,application/json')
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from users.authentication import token_cache
+from users.models import DeviceSession
+from .utils import TestBase
+
+UserModel = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestBase):
+
+    def setUp(self):
+        # user ids are reused from test to test, tombstones aren't
+        cache.clear()
+        token_cache.local.clear()
+
+    def test_cached_token_skips_db(self):
+        url = reverse('user-details')
+        self.register_user()
+        # first call warms the cache
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_logout_invalidates_cache(self):
+        url = reverse('user-details')
+        self.register_user()
+        self.client.get(url)
+        resp = self.client.post(reverse('user-logout'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_save_invalidates_cache(self):
+        url = reverse('user-details')
+        uid = self.register_user()
+        self.client.get(url)
+        user = UserModel.objects.get(id=uid)
+        user.is_active = False
+        # the user's entry only, no lookup of its sessions
+        with self.assertNumQueries(1):
+            user.save()
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_delete_invalidates_cache(self):
+        url = reverse('user-details')
+        uid = self.register_user()
+        self.client.get(url)
+        UserModel.objects.get(id=uid).delete()
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_while_read(self):
+        uid = self.register_user()
+        session = DeviceSession.objects.select_related('user').get(user_id=uid)
+        self.assertIsNone(token_cache.get(session.key, DeviceSession))
+        # revoked between the database read and the cache write
+        DeviceSession.objects.revoke_all(session.user)
+        token_cache.set(session.key, session)
+        self.assertIsNone(token_cache.get(session.key, DeviceSession))
+
+    def test_instances_not_shared(self):
+        uid = self.register_user()
+        self.client.get(reverse('user-details'))
+        key = DeviceSession.objects.get(user_id=uid).key
+        first = token_cache.get(key, DeviceSession)
+        second = token_cache.get(key, DeviceSession)
+        self.assertEqual(first.user.pk, uid)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.user, second.user)
+
+    def test_cache_down(self):
+        url = reverse('user-details')
+        self.register_user()
+        self.client.get(url)
+        token_cache.local.clear()
+        broken = mock.Mock(**{'%s.side_effect' % method: ConnectionError('redis down')
+                              for method in ('get', 'add', 'set_many', 'delete')})
+        with mock.patch('users.authentication.cache', broken):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from users.bloom import PhoneBloomFilter
+
+
+class PhoneBloomFilterTests(SimpleTestCase):
+
+    def test_sizing(self):
+        bloom = PhoneBloomFilter(capacity=10000000, error_rate=0.001, refresh_interval=60)
+        self.assertEqual(bloom.hashes, 10)
+        self.assertAlmostEqual(bloom.size / 8 / 1024 / 1024, 17.14, places=2)
+
+    def test_no_false_negatives(self):
+        bloom = PhoneBloomFilter(capacity=1000, error_rate=0.01, refresh_interval=60)
+        bitmap = bytearray(bloom.size // 8)
+        phones = ['189%08d' % i for i in range(1000)]
+        for phone in phones:
+            bloom.set_bits(bitmap, bloom.positions(phone))
+        self.assertTrue(all(bloom.has_bits(bitmap, bloom.positions(p)) for p in phones))
+
+        others = ['186%08d' % i for i in range(10000)]
+        false_positives = sum(bloom.has_bits(bitmap, bloom.positions(p)) for p in others)
+        self.assertLess(false_positives / len(others), 0.02)
+
+    def test_unavailable_means_maybe(self):
+        # the tests' cache isn't necessarily redis, nor built
+        bloom = PhoneBloomFilter(capacity=1000, error_rate=0.01, refresh_interval=60)
+        self.assertTrue(bloom.might_contain('18900000001'))
+
+    @override_settings(PHONE_BLOOM_ENABLED=True)
+    def test_failed_add_turns_filter_off(self):
+        bloom = PhoneBloomFilter(capacity=1000, error_rate=0.01, refresh_interval=0)
+        bloom._ready = b'1'
+        with mock.patch('users.bloom.get_redis', side_effect=ConnectionError):
+            bloom.add('+8618900000001')
+
+        # redis is back, with a bitmap missing the phone
+        redis = mock.Mock()
+        redis.pipeline.return_value.execute.return_value = [b'1', bytes(bloom.size // 8)]
+        with mock.patch('users.bloom.get_redis', return_value=redis):
+            self.assertIsNone(bloom.get_local())
+            self.assertTrue(bloom.might_contain('+8618900000001'))
+            # rebuilt
+            redis.pipeline.return_value.execute.return_value = [b'2', bytes(bloom.size // 8)]
+            self.assertIsNotNone(bloom.get_local())
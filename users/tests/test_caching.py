@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from users.caching import UserResponseCache
+
+
+class UserResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cache = UserResponseCache('test')
+        self.addCleanup(UserResponseCache.instances.remove, self.cache)
+        self.version = timezone.now()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return {'build': self.builds}
+
+    def test_versions(self):
+        self.assertEqual(self.cache.get_or_set(1, self.version, self.build), {'build': 1})
+        self.assertEqual(self.cache.get_or_set(1, self.version, self.build), {'build': 1})
+
+        newer = self.version + timedelta(seconds=1)
+        self.assertNotEqual(self.cache.etag(1, newer), self.cache.etag(1, self.version))
+        self.assertEqual(self.cache.get_or_set(1, newer, self.build), {'build': 2})
+
+        UserResponseCache.invalidate(1)
+        self.assertEqual(self.cache.get_or_set(1, newer, self.build), {'build': 3})
+
+    def test_waits_for_the_lock_holder(self):
+        cache.add(self.cache.key(1) + ':lock', 1)
+        self.cache.wait_timeout = 0.1
+        self.assertEqual(self.cache.get_or_set(1, self.version, self.build), {'build': 1})
+        # the lock holder didn't deliver - built, but not cached
+        self.assertIsNone(cache.get(self.cache.key(1)))
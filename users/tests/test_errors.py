@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase
+from django.utils import translation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from users.views.base import UnauthenticatedAPIView
+from users.views.errors import (
+    ErrorCatalog, IncorrectPassword, InvalidDateFormat, PhoneUnregistered,
+    RateLimited, ServiceBusy, error_catalog)
+
+
+class FailingView(UnauthenticatedAPIView):
+    throttle_classes = ()
+    error = None
+
+    def post(self, request):
+        raise self.error
+
+
+class ErrorCatalogTests(SimpleTestCase):
+
+    def request(self, error, **extra):
+        view = FailingView.as_view(error=error)
+        response = view(APIRequestFactory().post('/', {}, format='json', **extra))
+        response.render()
+        return response
+
+    def test_context_free(self):
+        self.assertTrue(ErrorCatalog.context_free(IncorrectPassword))
+        self.assertTrue(ErrorCatalog.context_free(ServiceBusy))
+        self.assertFalse(ErrorCatalog.context_free(RateLimited))
+
+    def test_same_response(self):
+        for error in [IncorrectPassword(), PhoneUnregistered(), ServiceBusy()]:
+            error_catalog.enabled = False
+            self.addCleanup(setattr, error_catalog, 'enabled', True)
+            expected = self.request(error)
+            error_catalog.enabled = True
+            response = self.request(error)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(sorted(response.items()), sorted(expected.items()))
+            self.assertEqual(response.data, expected.data)
+
+    def test_catalogued_bytes(self):
+        data, body = error_catalog.get(IncorrectPassword())
+        self.assertEqual(body, JSONRenderer().render(IncorrectPassword().data()))
+        self.assertIsNone(error_catalog.get(InvalidDateFormat(date_str='x')))
+
+    def test_other_language(self):
+        with translation.override('en'):
+            data, body = error_catalog.get(IncorrectPassword())
+        self.assertEqual(data['error_msg'], "Incorrect password")
+
+    def test_indented(self):
+        response = self.request(IncorrectPassword(), HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  "error_code": "incorrect_password"', response.content)
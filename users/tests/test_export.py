@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+
+from users import export
+from .utils import TestBase
+
+UserModel = get_user_model()
+
+
+class ExportTests(TestBase):
+
+    def setUp(self):
+        self.admin = UserModel.objects.create_superuser(
+            'admin', 'admin@example.com', 'mockedpw')
+        self.users = [UserModel.objects.create_by_phone(self.generate_phone())
+                      for _i in range(5)]
+
+    def test_keyset_batches(self):
+        with self.assertNumQueries(3):
+            rows = list(export.iter_users(batch_size=3))
+        self.assertEqual([row[0] for row in rows],
+                         sorted(u.id for u in [self.admin] + self.users))
+
+        rows = list(export.iter_users(after_id=self.users[2].id))
+        self.assertEqual([row[1] for row in rows], [u.phone for u in self.users[3:]])
+
+    def test_export_view(self):
+        url = reverse('user-export')
+        self.client.force_authenticate(self.users[0])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        content = b''.join(resp.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 6)
+        # the national number
+        self.assertEqual(rows[1]['phone'], self.users[0].phone[3:])
+
+        resp = self.client.get(url, {'output': 'jsonl',
+                                     'created_after': '2000-01-01',
+                                     'created_before': '2000-01-02'})
+        self.assertEqual(b''.join(resp.streaming_content), b'')
+
+        resp = self.client.get(url, {'created_after': 'yesterday'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['error_code'], 'invalid_date_format')
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_users', '--format', 'jsonl', stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(set(lines[0]), set(export.FIELDS))
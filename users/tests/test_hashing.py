@@ -0,0 +1,42 @@
+import os
+import signal
+
+from django.contrib.auth.hashers import check_password
+from django.test import SimpleTestCase
+
+from ..hashing import HashingServiceBusy, PasswordHashingService
+
+
+class PasswordHashingServiceTests(SimpleTestCase):
+
+    def test_hash_and_check(self):
+        service = PasswordHashingService(workers=0, max_pending=0)
+        encoded = service.make_password('mockedpw')
+        self.assertTrue(check_password('mockedpw', encoded))
+        self.assertTrue(service.check_password('mockedpw', encoded))
+        self.assertFalse(service.check_password('invalidpw', encoded))
+        stats = service.stats()
+        self.assertEqual(stats['completed'], 3)
+        self.assertGreater(stats['hash_seconds'], 0)
+
+    def test_reject_when_saturated(self):
+        service = PasswordHashingService(workers=0, max_pending=0)
+        # take the only slot
+        service._slots.acquire()
+        with self.assertRaises(HashingServiceBusy):
+            service.make_password('mockedpw')
+        self.assertEqual(service.stats()['rejected'], 1)
+        service._slots.release()
+        service.make_password('mockedpw')
+
+    def test_pool_process_dies(self):
+        service = PasswordHashingService(workers=1, max_pending=0)
+        self.addCleanup(lambda: service._executor.shutdown())
+        encoded = service.make_password('mockedpw')
+        # e.g. killed for running out of memory
+        for process in list(service._get_executor()._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        self.assertTrue(service.check_password('mockedpw', encoded))
+        self.assertEqual(service.stats()['pool_restarts'], 1)
+        self.assertTrue(service.check_password('mockedpw', encoded))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.test import TestCase
+
+UserModel = get_user_model()
+
+
+class ImportUsersTests(TestCase):
+
+    def write(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv(self):
+        UserModel.objects.create_by_phone('18900000003')
+        path = self.write('phone,password\n'
+                          '+86 189-0000-0001,mockedpw\n'
+                          '18900000002,\n'
+                          '18900000001,otherpw\n'
+                          '18900000003,\n'
+                          '123,\n', '.csv')
+        out = StringIO()
+        with mock.patch('users.management.commands.import_users.phone_bloom') as bloom:
+            call_command('import_users', path, '--workers', '1', '--batch-size', '2',
+                         '--verified', stdout=out)
+        self.assertIn('5 read, 2 inserted, 2 duplicate, 1 invalid', out.getvalue())
+        added = [phone for call in bloom.add_many.call_args_list for phone in call[0][0]]
+        self.assertEqual(sorted(added), ['+8618900000001', '+8618900000002'])
+
+        user = UserModel.objects.get(phone='+8618900000001')
+        self.assertTrue(user.verified)
+        self.assertTrue(check_password('mockedpw', user.password))
+        self.assertEqual(user.phone_key, 8618900000001)
+        self.assertEqual(UserModel.objects.get(phone='+8618900000002').password, '')
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_resume_from_checkpoint(self):
+        path = self.write('{"phone": "18900000001"}\n'
+                          '{"phone": "18900000002"}\n', '.jsonl')
+        with open(path + '.checkpoint', 'w') as f:
+            f.write('{"done": 1}')
+        call_command('import_users', path, '--workers', '1', stdout=StringIO())
+        self.assertFalse(UserModel.objects.filter(phone='+8618900000001').exists())
+        self.assertTrue(UserModel.objects.filter(phone='+8618900000002').exists())
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from users.lookup import lookup_users
+from .utils import TestBase
+
+UserModel = get_user_model()
+
+
+class LookupUsersTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [UserModel.objects.create_by_phone('1890000000%d' % i)
+                      for i in range(3)]
+
+    def test_one_query_then_cache(self):
+        ids = [self.users[0].pk, 0]
+        phones = ['+8618900000001', '+8618900000009']
+        with self.assertNumQueries(1):
+            by_id, by_phone = lookup_users(ids, phones)
+        self.assertEqual(by_id[self.users[0].pk]['phone'], '+8618900000000')
+        self.assertIsNone(by_id[0])
+        self.assertEqual(by_phone['+8618900000001']['id'], self.users[1].pk)
+        self.assertIsNone(by_phone['+8618900000009'])
+
+        with self.assertNumQueries(0):
+            lookup_users([self.users[0].pk], ['+8618900000001'])
+
+    def test_saved_user_dropped(self):
+        lookup_users([], ['+8618900000001'])
+        user = self.users[1]
+        user.phone = '18900000008'
+        user.save()
+        by_id, by_phone = lookup_users([user.pk], ['+8618900000001', '+8618900000008'])
+        self.assertEqual(by_id[user.pk]['phone'], '+8618900000008')
+        self.assertIsNone(by_phone['+8618900000001'])
+        self.assertEqual(by_phone['+8618900000008']['id'], user.pk)
+
+    def test_deleted_user_dropped(self):
+        ids = [user.pk for user in self.users]
+        lookup_users(ids, ['+8618900000000', '+8618900000001'])
+        # one by one as the admin does, in bulk as purge_stale does
+        self.users[0].delete()
+        UserModel.objects.filter(pk=self.users[1].pk).delete()
+        by_id, by_phone = lookup_users(ids, ['+8618900000000', '+8618900000001'])
+        self.assertIsNone(by_id[ids[0]])
+        self.assertIsNone(by_id[ids[1]])
+        self.assertEqual(by_id[ids[2]]['phone'], '+8618900000002')
+        self.assertEqual(by_phone, {'+8618900000000': None, '+8618900000001': None})
+
+
+@override_settings(INTERNAL_SERVICE_KEYS={'tests': 'mocked-key'}, USER_LOOKUP_MAX_ITEMS=3)
+class UserLookupViewTests(TestBase):
+
+    def test_lookup(self):
+        url = reverse('user-lookup')
+        user = UserModel.objects.create_by_phone('18900000001')
+        data = {'ids': [user.pk, 0], 'phones': ['+86 189-0000-0001']}
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.post(url, data, format='json', HTTP_X_SERVICE_KEY='wrong')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        resp = self.client.post(url, data, format='json', HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['ids'][user.pk]['phone'], '18900000001')
+        self.assertEqual(resp.data['phones']['+86 189-0000-0001']['id'], user.pk)
+        self.assertEqual(resp.data['misses'], {'ids': [0], 'phones': []})
+
+        data['ids'] += [1, 2]
+        resp = self.client.post(url, data, format='json', HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
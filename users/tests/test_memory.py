@@ -0,0 +1,70 @@
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from users import memory
+from users.views.user import RegisterSerializer
+from .utils import TestBase
+
+UserModel = get_user_model()
+
+# kept referenced, so the leak stays
+leaked = []
+
+
+@override_settings(INTERNAL_SERVICE_KEYS={'tests': 'mocked-key'})
+class MemoryDiagnosticsTests(TestBase):
+
+    def setUp(self):
+        self.addCleanup(memory.stop)
+        self.addCleanup(leaked.clear)
+        self.url = reverse('memory')
+
+    def test_object_counts(self):
+        user = UserModel.objects.create_by_phone('18900000001')
+        objects = [user, Token(user=user), RegisterSerializer(data={'phone': user.phone})]
+        after, types = memory.object_counts(10)
+        for label in ('users', 'tokens', 'serializers'):
+            self.assertGreaterEqual(after[label], 1, label)
+        self.assertEqual(len(types), 10)
+        del objects
+
+    def test_allocations(self):
+        self.assertIsNone(memory.allocations(10, 'lineno'))
+        memory.start()
+        leaked.extend(bytearray(1000) for _ in range(1000))
+        report = memory.allocations(10, 'lineno')
+        self.assertTrue(report['baseline'])
+        site = report['sites'][0]
+        self.assertGreaterEqual(site['size_diff'], 1000 * 1000)
+        self.assertIn('test_memory.py', site['traceback'][0])
+
+    def test_view(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        resp = self.client.post(self.url, {'action': 'start', 'frames': 5}, format='json',
+                                HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data['tracing'])
+        self.assertEqual(tracemalloc.get_traceback_limit(), 5)
+
+        resp = self.client.get(self.url, {'limit': 3, 'group_by': 'filename'},
+                               HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['allocations']['sites']), 3)
+        self.assertEqual(len(resp.data['types']), 3)
+        self.assertIn('serializers', resp.data['objects'])
+        self.assertIn('token_local', resp.data['caches'])
+
+        resp = self.client.get(self.url, {'group_by': 'module'}, HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.post(self.url, {'action': 'stop'}, format='json',
+                                HTTP_X_SERVICE_KEY='mocked-key')
+        self.assertFalse(resp.data['tracing'])
+        self.assertIsNone(resp.data['allocations'])
@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users.metrics import EXITED, Metrics, metrics
+
+# above the largest pid Linux hands out
+EXITED_PID = 4194305
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.metrics = Metrics(self.directory, flush_interval=10)
+        self.metrics.declare('requests_total', 'counter', 'Requests.')
+        self.metrics.declare('duration_seconds', 'histogram', 'Duration.')
+
+    def test_threads(self):
+        def record():
+            for _ in range(1000):
+                self.metrics.inc('requests_total', view='a')
+            self.metrics.observe('duration_seconds', 0.02, view='a')
+            self.metrics.observe('duration_seconds', 20, view='a')
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        text = self.metrics.render()
+        self.assertIn('# TYPE users_requests_total counter\n', text)
+        self.assertIn('users_requests_total{view="a"} 4000\n', text)
+        self.assertIn('users_duration_seconds_bucket{view="a",le="0.01"} 0\n', text)
+        self.assertIn('users_duration_seconds_bucket{view="a",le="0.025"} 4\n', text)
+        self.assertIn('users_duration_seconds_bucket{view="a",le="+Inf"} 8\n', text)
+        self.assertIn('users_duration_seconds_sum{view="a"} 80.08\n', text)
+        self.assertIn('users_duration_seconds_count{view="a"} 8\n', text)
+
+    def test_processes(self):
+        self.metrics.inc('requests_total', 2, view='a')
+        snapshot = {
+            'counters': [['requests_total', [['view', 'a']], 5]],
+            'histograms': [],
+            'gauges': [['pending', [], 7]],
+        }
+        with open(os.path.join(self.directory, '%d.json' % EXITED_PID), 'w') as f:
+            json.dump(snapshot, f)
+
+        text = self.metrics.render()
+        self.assertIn('users_requests_total{view="a"} 7\n', text)
+        # gauges of exited processes are dropped, counters kept
+        self.assertNotIn('users_pending', text)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '%d.json' % EXITED_PID)))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, EXITED)))
+        self.assertIn('users_requests_total{view="a"} 7\n', self.metrics.render())
+
+
+class MetricsExportTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, metrics, 'directory', metrics.directory)
+        metrics.directory = directory
+
+    def test_export(self):
+        resp = self.client.post(reverse('user-register'), {'phone': '123'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        text = resp.content.decode()
+        self.assertIn('users_http_requests_total{method="POST",status="400",view="user-register"}',
+                      text)
+        self.assertIn('users_http_request_duration_seconds_count{method="POST",view="user-register"}',
+                      text)
+        self.assertIn('users_api_errors_total{code="serializer_validation_error",view="user-register"}',
+                      text)
+        self.assertIn('# TYPE users_password_hashing_total counter', text)
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+UserModel = get_user_model()
+
+
+class ProfileMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        self.user = UserModel.objects.create_user(
+            'admin', password='passw0rd!x', phone='+8618900000001',
+            is_staff=True, verified=True)
+
+    def test_api_profile(self):
+        resp = self.client.post(reverse('user-register'), {'phone': '123'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.wsgi_request.profile, 'api')
+        self.assertFalse(hasattr(resp.wsgi_request, 'session'))
+        self.assertNotIn('X-Frame-Options', resp)
+
+    def test_full_profile(self):
+        resp = self.client.get(reverse('admin:login'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.wsgi_request.profile, 'full')
+        self.assertEqual(resp['X-Frame-Options'], 'SAMEORIGIN')
+        self.assertIn('csrftoken', resp.cookies)
+        # csrf is enforced by the wrapped CsrfViewMiddleware
+        self.client.handler.enforce_csrf_checks = True
+        resp = self.client.post(reverse('admin:login'), {'username': 'admin'})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_no_session_authentication(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('user-details'))
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(API_PROFILE_PREFIXES=[])
+    def test_full_stack_everywhere(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('user-details'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.wsgi_request.profile, 'full')
@@ -0,0 +1,76 @@
+import time
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands import sms_worker
+from ..models import SMSOutbox
+from ..providers import get_provider
+from ..verification import send_login_code
+
+
+@override_settings(SMS_PROVIDER='users.providers.LocalProvider',
+                   SMS_OUTBOX_ENABLED=True, SMS_OUTBOX_MAX_ATTEMPTS=2)
+class SMSOutboxTests(TestCase):
+
+    def setUp(self):
+        self.provider = get_provider()
+        self.provider.sent.clear()
+
+    def test_code_is_queued_then_sent(self):
+        succeed, err_msg = send_login_code('18900001111')
+        self.assertTrue(succeed)
+        # nothing sent inside the request
+        self.assertEqual(self.provider.sent, [])
+        msg = SMSOutbox.objects.get()
+        self.assertEqual(msg.status, SMSOutbox.PENDING)
+
+        call_command('sms_worker', '--once')
+        msg.refresh_from_db()
+        self.assertEqual(msg.status, SMSOutbox.SENT)
+        self.assertIsNotNone(msg.sent_ts)
+        # the code isn't kept once delivered
+        self.assertEqual(msg.message, '')
+        self.assertEqual(len(self.provider.sent), 1)
+        self.assertEqual(self.provider.sent[0][0], '18900001111')
+        self.assertIn('Your verification code is', self.provider.sent[0][1])
+
+    @override_settings(SMS_LOCAL_FAILURE_RATE=1)
+    def test_retry_then_give_up(self):
+        msg = SMSOutbox.objects.enqueue('18900001111', 'hello')
+        call_command('sms_worker', '--once')
+        msg.refresh_from_db()
+        self.assertEqual(msg.status, SMSOutbox.PENDING)
+        self.assertEqual(msg.attempts, 1)
+        self.assertEqual(msg.last_error, 'simulated failure')
+        self.assertGreater(msg.next_attempt, msg.created)
+
+        # make it due again
+        SMSOutbox.objects.filter(id=msg.id).update(next_attempt=msg.created)
+        call_command('sms_worker', '--once')
+        msg.refresh_from_db()
+        self.assertEqual(msg.status, SMSOutbox.FAILED)
+        self.assertEqual(msg.attempts, 2)
+        self.assertEqual(msg.message, '')
+
+    @override_settings(SMS_OUTBOX_LEASE=0.1)
+    def test_lease_expires_mid_batch(self):
+        for i in range(3):
+            SMSOutbox.objects.enqueue('1890000111%d' % i, 'hello %d' % i)
+        send = self.provider.send
+
+        def slow_send(phone, message):
+            # the first message takes the whole lease
+            time.sleep(0.1)
+            return send(phone, message)
+
+        with mock.patch.object(self.provider, 'send', side_effect=slow_send):
+            claimed = sms_worker.Command().dispatch_batch(3)
+        self.assertEqual(claimed, 3)
+        self.assertEqual(self.provider.sent, [('18900001110', 'hello 0')])
+        self.assertEqual(SMSOutbox.objects.get(phone='18900001110').status, SMSOutbox.SENT)
+
+        # another worker claims what's left, not what was sent
+        claimed = SMSOutbox.objects.claim(10, 60)
+        self.assertEqual([msg.phone for msg in claimed], ['18900001111', '18900001112'])
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from users.phones import normalize_phone, phone_key, to_e164, to_national
+
+UserModel = get_user_model()
+
+
+class PhoneTests(SimpleTestCase):
+
+    def test_e164(self):
+        for value in ['18600001111', '186 0000 1111', '186-0000-1111',
+                      '+86 186 0000 1111', '0086 18600001111', '8618600001111']:
+            self.assertEqual(to_e164(value), '+8618600001111', value)
+        self.assertEqual(to_e164('+1 (202) 555-0100'), '+12025550100')
+        self.assertEqual(to_national('+8618600001111'), '18600001111')
+        self.assertEqual(normalize_phone('+86 186 0000 1111'), '18600001111')
+
+    def test_phone_key(self):
+        self.assertEqual(phone_key('+8618600001111'), 8618600001111)
+        self.assertIsNone(phone_key('18600001111'))
+        self.assertIsNone(phone_key(None))
+
+
+class UserPhoneTests(TestCase):
+
+    def test_canonical_on_save(self):
+        user = UserModel.objects.create_by_phone('186 0000 1111')
+        user.refresh_from_db()
+        self.assertEqual(user.phone, '+8618600001111')
+        self.assertEqual(user.phone_key, 8618600001111)
+        with self.assertNumQueries(1):
+            self.assertEqual(UserModel.objects.by_phone('+86 186-0000-1111').get(), user)
+        self.assertFalse(UserModel.objects.by_phone('').exists())
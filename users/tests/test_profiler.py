@@ -0,0 +1,81 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users.profiler import Sampler, make_token
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class SamplerTests(SimpleTestCase):
+
+    def test_stacks(self):
+        with Sampler(threading.get_ident(), 0.001) as sampler:
+            busy(0.1)
+        self.assertTrue(sampler.stacks)
+        stack = max(sampler.stacks, key=sampler.stacks.get)
+        self.assertTrue(stack.endswith(
+            'users.tests.test_profiler:test_stacks;users.tests.test_profiler:busy'), stack)
+
+
+class ProfilerTests(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(PROFILER_DIR=self.directory, PROFILER_INTERVAL=0.001)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def register(self, **extra):
+        return self.client.post(reverse('user-register'), {'phone': '123'}, format='json',
+                                **extra)
+
+    def test_not_profiled(self):
+        resp = self.register()
+        self.assertNotIn('X-Profile', resp)
+        resp = self.register(HTTP_X_PROFILE_TOKEN=make_token() + 'x')
+        self.assertNotIn('X-Profile', resp)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_token(self):
+        resp = self.register(HTTP_X_PROFILE_TOKEN=make_token())
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(resp['X-Profile'].startswith('user-register.%d.' % os.getpid()))
+        self.assertEqual(os.listdir(self.directory), [resp['X-Profile']])
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_sample_rate(self):
+        self.assertIn('X-Profile', self.register())
+
+    def test_merge(self):
+        for name, lines in (('user-register.1.1.folded', 'a;b 2\na;c 1\n'),
+                            ('user-register.2.1.folded', 'a;b 3\n'),
+                            ('user-details.2.1.folded', 'a;d 5\n')):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(lines)
+
+        out = io.StringIO()
+        call_command('merge_profiles', view='user-register', stdout=out, stderr=io.StringIO())
+        self.assertEqual(out.getvalue(), 'a;b 5\na;c 1\n')
+
+        out = io.StringIO()
+        call_command('merge_profiles', format='speedscope', stdout=out, stderr=io.StringIO())
+        profile = json.loads(out.getvalue())['profiles'][0]
+        self.assertEqual(profile['type'], 'sampled')
+        self.assertEqual(len(profile['samples']), 3)
+        self.assertAlmostEqual(profile['endValue'], 11 * 0.001)
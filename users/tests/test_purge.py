@@ -0,0 +1,78 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from users.management.commands import purge_stale
+from users.models import DeviceSession, SMSOutbox
+
+UserModel = get_user_model()
+
+
+class PurgeStaleTests(TestCase):
+
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(days=60)
+        self.stale = [UserModel.objects.create_by_phone('1890000000%d' % i) for i in range(3)]
+        UserModel.objects.filter(pk__in=[u.pk for u in self.stale]).update(created=long_ago)
+        self.fresh = UserModel.objects.create_by_phone('18900000009')
+        self.verified = UserModel.objects.create_by_phone('18900000008', verified=True)
+        UserModel.objects.filter(pk=self.verified.pk).update(created=long_ago)
+
+        self.active = DeviceSession.objects.start(self.verified)
+        self.expired = DeviceSession.objects.create(user=self.verified,
+                                                    expires=timezone.now())
+        Token.objects.create(user=self.verified, key=self.active.key)
+        Token.objects.create(user=self.fresh)
+
+        self.outbox = [SMSOutbox.objects.enqueue('18900000008', 'hello') for _i in range(3)]
+        SMSOutbox.objects.filter(pk__in=[m.pk for m in self.outbox[:2]]).update(
+            created=long_ago, status=SMSOutbox.SENT)
+        SMSOutbox.objects.filter(pk=self.outbox[2].pk).update(created=long_ago)
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_stale', '--chunk-size', '2', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        out = self.purge('--dry-run')
+        self.assertIn('users: 3 to delete', out)
+        self.assertIn('sessions: 1 to delete', out)
+        self.assertIn('tokens: 1 to delete', out)
+        self.assertIn('outbox: 2 to delete', out)
+        self.assertEqual(UserModel.objects.count(), 5)
+
+    def test_purge(self):
+        out = self.purge()
+        self.assertIn('users: 3 deleted', out)
+        self.assertEqual(set(UserModel.objects.all()), {self.fresh, self.verified})
+        self.assertEqual(list(DeviceSession.objects.all()), [self.active])
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [self.active.key])
+        # pending messages stay, however old
+        self.assertEqual(list(SMSOutbox.objects.all()), [self.outbox[2]])
+
+    def test_only(self):
+        self.purge('--only', 'sessions')
+        self.assertEqual(UserModel.objects.count(), 5)
+        self.assertEqual(list(DeviceSession.objects.all()), [self.active])
+
+    def test_verified_meanwhile(self):
+        calls = []
+
+        def stale_users():
+            calls.append(1)
+            if len(calls) == 2:
+                # between the SELECT of the first chunk and its DELETE
+                UserModel.objects.filter(pk=self.stale[0].pk).update(verified=True)
+            return purge_stale.stale_users()
+
+        with mock.patch.object(purge_stale, 'PURGES', [('users', stale_users)]):
+            out = self.purge()
+        self.assertIn('users: 2 deleted', out)
+        self.assertTrue(UserModel.objects.filter(pk=self.stale[0].pk).exists())
@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users.querytrace import QueryTracer, fingerprint, tracer
+
+
+class QueryTracerTests(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.tracer = QueryTracer(slow_seconds=0.5, sample_rate=1, summary_interval=300,
+                                  top=1, directory=self.directory, background=False)
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('SELECT a FROM t WHERE id IN (%s, %s, %s) AND b = %s'),
+                         'SELECT a FROM t WHERE id IN (%s, ...) AND b = %s')
+        self.assertEqual(fingerprint('SELECT a FROM t WHERE id IN (%s)'),
+                         'SELECT a FROM t WHERE id IN (%s)')
+
+    def test_summary(self):
+        select = 'SELECT "id" FROM "users_user" WHERE "id" IN (%s, %s)'
+        self.tracer.record('user-details', 'default', select, [1, 2], 0.75)
+        self.tracer.record('user-details', 'default', select.replace('%s, %s', '%s, %s, %s'),
+                           [1, 2, 3], 0.25)
+        self.tracer.record('user-register', 'default', 'SELECT 1', [], 0.125)
+        # what the tracer thread does
+        self.tracer.run_pending()
+        self.assertTrue(self.tracer._queue.empty())
+
+        with open(self.tracer.write_summary()) as f:
+            summary = f.read()
+        self.assertIn('top 1 of 2 statements', summary)
+        self.assertIn('1.000s total, 2 calls, 500.0ms avg, 750.0ms max - user-details on default',
+                      summary)
+        self.assertIn('IN (%s, ...)', summary)
+        self.assertIn('EXPLAIN (0.750s)', summary)
+        self.assertNotIn('user-register', summary)
+        # a new window
+        self.assertIsNone(self.tracer.write_summary())
+
+    def test_explain_selects_only(self):
+        key = ('user-details', 'default', 'UPDATE "users_user" SET "verified" = %s')
+        self.tracer.explain(key, 'default', key[2], [True], 1.0)
+        self.assertEqual(self.tracer._plans[key], (1.0, None))
+
+
+class QueryTraceMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, tracer, 'directory', tracer.directory)
+        tracer.directory = directory
+        self.addCleanup(setattr, tracer, 'background', tracer.background)
+        tracer.background = False
+        self.addCleanup(tracer.write_summary)
+        tracer.write_summary()
+
+    def test_disabled(self):
+        self.client.post(reverse('user-register'), {'phone': '+8618900000001'}, format='json')
+        self.assertEqual(tracer._stats, {})
+
+    @override_settings(QUERY_TRACE_ENABLED=True)
+    def test_attribution(self):
+        resp = self.client.post(reverse('user-register'), {'phone': '+8618900000001'},
+                                format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        views = {view for view, _alias, _statement in tracer._stats}
+        self.assertIn('user-register', views)
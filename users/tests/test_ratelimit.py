@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from ..ratelimit import LocalBuckets
+from .utils import TestBase
+
+
+class LocalBucketsTests(SimpleTestCase):
+
+    def test_take_and_refill(self):
+        buckets = LocalBuckets()
+        spec = [('phone', 2, 10)]
+        self.assertEqual(buckets.take(spec, now=100), 0)
+        self.assertEqual(buckets.take(spec, now=100), 0)
+        self.assertAlmostEqual(buckets.take(spec, now=100), 10)
+        self.assertAlmostEqual(buckets.take(spec, now=104), 6)
+        self.assertEqual(buckets.take(spec, now=110), 0)
+
+    def test_all_or_nothing(self):
+        buckets = LocalBuckets()
+        self.assertEqual(buckets.take([('ip', 1, 10)], now=100), 0)
+        # ip bucket is empty - phone bucket must not be charged
+        self.assertGreater(buckets.take([('phone', 1, 10), ('ip', 1, 10)], now=100), 0)
+        self.assertEqual(buckets.take([('phone', 1, 10)], now=100), 0)
+
+    def test_bounded(self):
+        buckets = LocalBuckets(maxsize=3)
+        for i in range(10):
+            self.assertEqual(buckets.take([('phone:%d' % i, 2, 10)], now=100), 0)
+        self.assertEqual(len(buckets), 3)
+        # refilled buckets are dropped
+        self.assertEqual(buckets.take([('ip', 2, 10)], now=111), 0)
+        self.assertEqual(len(buckets), 1)
+
+
+@override_settings(RATE_LIMITS={'sms_code': {'phone': (1, 60)},
+                            'verify_code': {'phone': (2, 60)}})
+class RateLimitViewTests(TestBase):
+
+    def test_register_code_rate_limited(self):
+        url = reverse('user-register')
+        data = {'phone': self.generate_phone()}
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp.data['error_code'], 'rate_limited')
+        self.assertTrue(0 < int(resp['Retry-After']) <= 60)
+
+    def test_register_guesses_rate_limited(self):
+        url = reverse('user-register')
+        data = {'phone': self.generate_phone(), 'code': '000000', 'password': 'mockedpw'}
+        for _ in range(2):
+            resp = self.client.post(url, data, format='json')
+            self.assertEqual(resp.data['error_code'], 'phone_verification_error')
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
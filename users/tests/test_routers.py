@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase
+from django.db import transaction
+
+from users import routers
+from users.authentication import DeviceSessionAuthentication
+from users.models import DeviceSession
+from users.writebehind import last_seen_buffer
+
+UserModel = get_user_model()
+
+
+@unittest.skipUnless('replica' in settings.DATABASES,
+                     'run with --settings=users.tests.replica_settings')
+class ReplicaRouterTests(TransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        routers._replica_health.clear()
+        cache.clear()
+        # only on the primary - the "replica" never catches up in these tests
+        self.user = UserModel.objects.create_by_phone('18900000001')
+
+    def exists(self):
+        return UserModel.objects.filter(phone=self.user.phone).exists()
+
+    def test_reads_go_to_replica(self):
+        self.assertTrue(self.exists())
+        with routers.replica_reads():
+            self.assertFalse(self.exists())
+            with transaction.atomic():
+                self.assertTrue(self.exists())
+
+    def test_reads_after_write_stick_to_primary(self):
+        with routers.replica_reads() as state:
+            self.assertFalse(self.exists())
+            self.user.save()
+            self.assertTrue(state.wrote)
+            self.assertTrue(self.exists())
+
+    def test_lagging_replica(self):
+        with mock.patch('users.routers.replica_lag', return_value=60):
+            with routers.replica_reads():
+                self.assertTrue(self.exists())
+
+    def test_middleware_pins_user(self):
+        def write(request):
+            UserModel.objects.create_by_phone('18900000002')
+            return HttpResponse()
+
+        def read(request):
+            return HttpResponse(str(self.exists()))
+
+        factory = RequestFactory()
+        middleware = routers.ReplicaRoutingMiddleware
+        self.assertEqual(middleware(read)(factory.get('/', HTTP_AUTHORIZATION='Token a')).content,
+                         b'False')
+        middleware(write)(factory.post('/', HTTP_AUTHORIZATION='Token a'))
+        self.assertEqual(middleware(read)(factory.get('/', HTTP_AUTHORIZATION='Token a')).content,
+                         b'True')
+        # the same IP, another user
+        self.assertEqual(middleware(read)(factory.get('/', HTTP_AUTHORIZATION='Token b')).content,
+                         b'False')
+        self.assertEqual(middleware(read)(factory.get('/')).content, b'False')
+
+    def test_registration_pins_phone_and_token(self):
+        def register(request):
+            routers.pin_on_write(token='new', phone=self.user.phone)
+            self.user.save()
+            return HttpResponse()
+
+        def login(request):
+            routers.read_primary_if_pinned(self.user.phone)
+            return HttpResponse(str(self.exists()))
+
+        factory = RequestFactory()
+        middleware = routers.ReplicaRoutingMiddleware
+        self.assertEqual(middleware(login)(factory.post('/')).content, b'False')
+        middleware(register)(factory.post('/'))
+        self.assertEqual(middleware(login)(factory.post('/')).content, b'True')
+        self.assertEqual(middleware(login)(factory.get('/', HTTP_AUTHORIZATION='Token new')).content,
+                         b'True')
+
+    def test_fresh_token_found_on_primary(self):
+        session = DeviceSession.objects.start(self.user)
+        self.addCleanup(last_seen_buffer.flush)
+        with routers.replica_reads():
+            user, token = DeviceSessionAuthentication().authenticate_credentials(session.key)
+        self.assertEqual(user, self.user)
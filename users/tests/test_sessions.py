@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from ..models import DeviceSession
+from .utils import TestBase
+
+
+class DeviceSessionTests(TestBase):
+
+    def login(self, phone, device_id):
+        url = reverse('password-login')
+        data = {'phone': phone, 'password': 'mockedpw', 'device_id': device_id}
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data['token']
+
+    def get_details(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        return self.client.get(reverse('user-details'))
+
+    def test_one_session_per_device(self):
+        phone = self.generate_phone()
+        self.register_user(phone)
+        phone_token = self.login(phone, 'phone')
+        pad_token = self.login(phone, 'pad')
+        self.assertNotEqual(phone_token, pad_token)
+        self.assertEqual(self.get_details(phone_token).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_details(pad_token).status_code, status.HTTP_200_OK)
+
+        # login again on the same device replaces its session
+        new_phone_token = self.login(phone, 'phone')
+        self.assertEqual(self.get_details(phone_token).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_details(new_phone_token).status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(self.get_details(pad_token).status_code, status.HTTP_200_OK)
+
+    def test_logout_all_devices(self):
+        phone = self.generate_phone()
+        self.register_user(phone)
+        phone_token = self.login(phone, 'phone')
+        pad_token = self.login(phone, 'pad')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + phone_token)
+        resp = self.client.post(reverse('user-logout-all'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_details(phone_token).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_details(pad_token).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_session(self):
+        uid = self.register_user()
+        session = DeviceSession.objects.get(user_id=uid)
+        DeviceSession.objects.filter(key=session.key).update(
+            expires=timezone.now() - timedelta(seconds=1))
+        resp = self.get_details(session.key)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
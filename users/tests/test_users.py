@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import status
+from ..views import RegisterView
+from ..writebehind import flush_all
 from .utils import TestBase
 
 UserModel = get_user_model()
@@ -44,11 +47,69 @@ class UserTests(TestBase):
         self.assertIn('user_id', resp.data)
         self.assertEqual(len(resp.data['token']), 40)
 
+        # retry the same submission - same user & token
+        retry = self.client.post(url, data, format='json')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, resp.data)
+
         # try register again
+        resp = self.client.post(url, {'phone': data['phone']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data['error_code'], 'phone_registered')
+
+        # same phone & code, another password - not a retry
+        resp = self.client.post(url, dict(data, password='An0ther-passw0rd'), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data['error_code'], 'phone_registered')
+        self.assertNotIn('token', resp.data)
+
+        cache.delete(RegisterView.retry_cache_key('+86' + data['phone'], data['code'],
+                                                  data['password']))
         resp = self.client.post(url, data, format='json')
         self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
         self.assertEqual(resp.data['error_code'], 'phone_registered')
 
+    def test_register_retry_after_logout(self):
+        url = reverse('user-register')
+        data = {'phone': self.generate_phone(), 'code': '111111', 'password': 'mockedpw'}
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + resp.data['token'])
+        self.client.post(reverse('user-logout'))
+
+        # the revoked token isn't handed out again
+        self.client.credentials()
+        resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIn('token', resp.data)
+
+    def test_register_retry_in_flight(self):
+        data = {'phone': '+8618900000001', 'code': '111111', 'password': 'mockedpw'}
+        key = RegisterView.retry_cache_key(data['phone'], data['code'], data['password'])
+        # the first submission holds the lock, a retry waits for it
+        cache.add(key + ':lock', 1, 30)
+        self.addCleanup(cache.delete, key + ':lock')
+        cache.add(key + ':waiter', 1, 30)
+        self.addCleanup(cache.delete, key + ':waiter')
+
+        # another retry doesn't wait
+        resp = self.client.post(reverse('user-register'), data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp.data['error_code'], 'service_busy')
+
+    def test_register_query_budget(self):
+        url = reverse('user-register')
+        data = {'phone': self.generate_phone(),
+                'code': '111111',
+                'password': 'mockedpw'}
+        # no write-behind flush within the measured request
+        flush_all()
+        # SELECT ... FOR UPDATE, INSERT user, INSERT token, plus the
+        # SAVEPOINT & RELEASE of the transaction nested in the test case
+        with self.assertNumQueries(5):
+            resp = self.client.post(url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
     def test_password_login(self):
         url = reverse('password-login')
         # invalid phone
@@ -162,3 +223,37 @@ class UserTests(TestBase):
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(resp.data['phone'], phone)
+
+    def test_phone_formats(self):
+        phone = self.generate_phone()
+        self.register_user(phone=phone)
+
+        # same phone, other format - same account
+        url = reverse('user-register')
+        spaced = '+86 %s %s %s' % (phone[:3], phone[3:7], phone[7:])
+        resp = self.client.post(url, {'phone': spaced}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+
+        url = reverse('password-login')
+        resp = self.client.post(url, {'phone': spaced, 'password': 'mockedpw'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_user_details_conditional_get(self):
+        url = reverse('user-details')
+        self.register_user()
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp['ETag']
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # a changed user is a new version
+        user = UserModel.objects.get(pk=resp.wsgi_request.user.pk)
+        user.first_name = 'changed'
+        user.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
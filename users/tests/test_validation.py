@@ -0,0 +1,86 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.http import QueryDict
+from rest_framework import serializers
+
+from users.views.errors import SerializerValidationError
+from users.views.user import (
+    PasswordLoginSerializer, PhoneCodeSerializer, RegisterSerializer,
+    RegisterStep2Serializer)
+from users.views.validation import RequestValidator
+
+PHONES = [
+    '18600001111', '+86 186 0000 1111', '186-0000-1111', ' 18600001111 ',
+    '1860000111', '28600001111', '', '   ', None, 18600001111, True, [], {},
+]
+PASSWORDS = ['passw0rd!x', 'password', 'short1', '', ' ', None, 12345678901, False]
+CODES = ['123456', '1234567', ' 1234 ', '', None, 123456, 1.5, ['1']]
+
+
+def cases(**values):
+    """Every payload combining one value - or nothing - per field"""
+    payloads = [{}]
+    for name, options in values.items():
+        payloads = [dict(payload, **{name: value}) for payload in payloads
+                    for value in options] + payloads
+    return payloads
+
+
+def outcome(validate, data):
+    try:
+        return 'valid', dict(validate(data))
+    except SerializerValidationError as e:
+        errors = e.data()['err_fields']
+    return 'invalid', {name: [(str(error), error.code) for error in field_errors]
+                       for name, field_errors in errors.items()}
+
+
+def with_serializer(serializer_class):
+    def validate(data):
+        serializer = serializer_class(data=data)
+        if not serializer.is_valid():
+            raise SerializerValidationError(serializer.errors)
+        return serializer.data
+    return validate
+
+
+class RequestValidatorParityTests(SimpleTestCase):
+
+    def assertParity(self, serializer_class, payloads):
+        validator = RequestValidator(serializer_class)
+        for data in payloads:
+            expected = outcome(with_serializer(serializer_class), data)
+            self.assertEqual(outcome(validator.validate, data), expected, data)
+
+    def test_register(self):
+        self.assertParity(RegisterSerializer, cases(
+            phone=PHONES, code=CODES[:5], password=PASSWORDS[:4], extra=['x']))
+
+    def test_register_step2(self):
+        self.assertParity(RegisterStep2Serializer, cases(
+            phone=PHONES[:8], code=CODES, password=PASSWORDS))
+
+    def test_phone_code_login(self):
+        self.assertParity(PhoneCodeSerializer, cases(phone=PHONES, code=CODES))
+
+    def test_password_login(self):
+        self.assertParity(PasswordLoginSerializer, cases(phone=PHONES, password=PASSWORDS))
+
+    def test_accepts(self):
+        self.assertTrue(RequestValidator.accepts({'phone': '18600001111'}))
+        self.assertFalse(RequestValidator.accepts(QueryDict('phone=18600001111')))
+        self.assertFalse(RequestValidator.accepts(['18600001111']))
+
+    def test_not_compiled(self):
+        class WithValidateMethod(serializers.Serializer):
+            phone = serializers.CharField()
+
+            def validate_phone(self, value):
+                return value
+
+        class WithIntegerField(serializers.Serializer):
+            count = serializers.IntegerField()
+
+        for serializer_class in [WithValidateMethod, WithIntegerField]:
+            with self.assertRaises(ImproperlyConfigured):
+                RequestValidator(serializer_class)
@@ -0,0 +1,55 @@
+from django.test import SimpleTestCase, override_settings
+
+from .. import verification
+from ..verification import MemoryCodeStore
+
+
+class MemoryCodeStoreTests(SimpleTestCase):
+
+    def test_verify_consumes_code(self):
+        store = MemoryCodeStore(timeout=60, max_attempts=3)
+        store.save('register', '18900001111', '123456')
+        self.assertEqual(store.verify('register', '18900001111', '123456'),
+                         verification.VERIFIED)
+        self.assertEqual(store.verify('register', '18900001111', '123456'),
+                         verification.EXPIRED)
+
+    def test_attempt_limit(self):
+        store = MemoryCodeStore(timeout=60, max_attempts=3)
+        store.save('login', '18900001111', '123456')
+        self.assertEqual(store.verify('login', '18900001111', '000000'),
+                         verification.INVALID)
+        self.assertEqual(store.verify('login', '18900001111', '000001'),
+                         verification.INVALID)
+        self.assertEqual(store.verify('login', '18900001111', '000002'),
+                         verification.TOO_MANY_ATTEMPTS)
+        # code is burnt
+        self.assertEqual(store.verify('login', '18900001111', '123456'),
+                         verification.EXPIRED)
+
+    def test_purposes_are_separated(self):
+        store = MemoryCodeStore(timeout=60, max_attempts=3)
+        store.save('login', '18900001111', '123456')
+        self.assertEqual(store.verify('register', '18900001111', '123456'),
+                         verification.EXPIRED)
+
+    @override_settings(VERIFICATION_CODE_FIXED=None, SMS_OUTBOX_ENABLED=False,
+                       VERIFICATION_CODE_STORE='users.verification.MemoryCodeStore')
+    def test_send_and_verify(self):
+        phone = '18900001111'
+        succeed, err_msg = verification.send_login_code(phone)
+        self.assertTrue(succeed)
+        succeed, err_msg = verification.verify_login_code(phone, 'wrong')
+        self.assertFalse(succeed)
+        self.assertEqual(err_msg, 'Invalid code')
+
+    @override_settings(VERIFICATION_CODE_FIXED='111111', SMS_OUTBOX_ENABLED=False,
+                       VERIFICATION_CODE_STORE='users.verification.MemoryCodeStore')
+    def test_fixed_code_dummy_provider_only(self):
+        phone = '18900001111'
+        succeed, err_msg = verification.verify_login_code(phone, '111111')
+        self.assertTrue(succeed)
+        with override_settings(SMS_PROVIDER='users.providers.LocalProvider'):
+            self.assertNotEqual(verification.generate_code(), '111111')
+            succeed, err_msg = verification.verify_login_code(phone, '111111')
+            self.assertFalse(succeed)
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..writebehind import ActivityBuffer
+
+UserModel = get_user_model()
+
+
+class ActivityBufferTests(TestCase):
+
+    def setUp(self):
+        self.users = [UserModel.objects.create(username=phone, phone=phone)
+                      for phone in ('18900000001', '18900000002')]
+
+    @override_settings(ACTIVITY_FLUSH_SIZE=100, ACTIVITY_FLUSH_INTERVAL=3600)
+    def test_flush_in_one_update(self):
+        buffer = ActivityBuffer('users.User', 'last_login')
+        now = timezone.now()
+        earlier = now - timedelta(minutes=1)
+        buffer.record(self.users[0].pk, earlier)
+        buffer.record(self.users[0].pk, now)
+        buffer.record(self.users[1].pk, earlier)
+        # nothing written yet
+        self.assertIsNone(UserModel.objects.get(pk=self.users[0].pk).last_login)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(UserModel.objects.get(pk=self.users[0].pk).last_login, now)
+        self.assertEqual(UserModel.objects.get(pk=self.users[1].pk).last_login, earlier)
+        stats = buffer.stats()
+        self.assertEqual(stats['recorded'], 3)
+        self.assertEqual(stats['flushed'], 2)
+        self.assertEqual(stats['pending'], 0)
+
+    @override_settings(ACTIVITY_FLUSH_SIZE=2, ACTIVITY_FLUSH_INTERVAL=3600)
+    def test_flush_when_full(self):
+        buffer = ActivityBuffer('users.User', 'last_login')
+        now = timezone.now()
+        buffer.record(self.users[0].pk, now)
+        self.assertEqual(buffer.stats()['pending'], 1)
+        buffer.record(self.users[1].pk, now)
+        self.assertEqual(buffer.stats()['pending'], 0)
+        self.assertEqual(UserModel.objects.get(pk=self.users[1].pk).last_login, now)
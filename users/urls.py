@@ -7,6 +7,9 @@ urlpatterns = [
     path('v1/users/login/', views.PhoneCodeLoginView.as_view(), name='user-login'),
     path('v1/users/password_login/', views.PasswordLoginView.as_view(), name='password-login'),
     path('v1/users/logout/', views.LogoutView.as_view(), name='user-logout'),
+    path('v1/users/logout_all/', views.LogoutAllView.as_view(), name='user-logout-all'),
+    path('v1/users/export/', views.UserExportView.as_view(), name='user-export'),
+    path('v1/users/lookup/', views.UserLookupView.as_view(), name='user-lookup'),
     path('v1/users/user_details/', views.UserDetailsView.as_view(), name='user-details'),
     path('v1/users/reset_password_by_phone_code/', views.SetPasswordByPhoneCodeView.as_view(),
          name='user-set-password-by-phone-code'),
@@ -0,0 +1,230 @@
+"""
+Phone verification codes
+
+Codes are generated and kept here, in the store selected by
+`settings.VERIFICATION_CODE_STORE`, and queued in the SMS outbox for
+delivery (see the `sms_worker` management command).
+A code lives for VERIFICATION_CODE_TIMEOUT seconds, is consumed by the
+first successful verification and is burnt after
+VERIFICATION_CODE_MAX_ATTEMPTS wrong guesses.
+
+The `send_*_code` / `verify_*_code` helpers return `(succeed, err_msg)`
+tuples, like the ones of the `sms` package they replace.
+"""
+import hmac
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django.utils.translation import ugettext as _
+
+from .models import SMSOutbox
+from .providers import DummyProvider, get_provider
+
+PURPOSE_REGISTER = 'register'
+PURPOSE_LOGIN = 'login'
+PURPOSE_PASSWORD_CHANGE = 'password_change'
+
+# verification results
+VERIFIED = 'verified'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+TOO_MANY_ATTEMPTS = 'too_many_attempts'
+
+ERROR_MESSAGES = {
+    INVALID: 'Invalid code',
+    EXPIRED: 'Code expired or never sent',
+    TOO_MANY_ATTEMPTS: 'Too many attempts - request a new code',
+}
+
+
+class BaseCodeStore(object):
+    """
+    Pluggable storage of verification codes
+
+    Override `save` and `verify`.
+    """
+
+    def __init__(self, timeout=None, max_attempts=None):
+        self.timeout = timeout or settings.VERIFICATION_CODE_TIMEOUT
+        self.max_attempts = max_attempts or settings.VERIFICATION_CODE_MAX_ATTEMPTS
+
+    def save(self, purpose, phone, code):
+        """Store `code`, replacing any pending code of the phone & purpose"""
+        raise NotImplementedError
+
+    def verify(self, purpose, phone, code):
+        """
+        Check and consume a code in one step
+
+        :return: VERIFIED, INVALID, EXPIRED or TOO_MANY_ATTEMPTS
+        """
+        raise NotImplementedError
+
+    def key(self, purpose, phone):
+        return 'users:vcode:%s:%s' % (purpose, phone)
+
+
+class MemoryCodeStore(BaseCodeStore):
+    """In-process store - for tests and development only"""
+
+    def __init__(self, *args, **kwargs):
+        super(MemoryCodeStore, self).__init__(*args, **kwargs)
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def save(self, purpose, phone, code):
+        with self._lock:
+            self._codes[self.key(purpose, phone)] = [
+                code, 0, time.monotonic() + self.timeout]
+
+    def verify(self, purpose, phone, code):
+        key = self.key(purpose, phone)
+        with self._lock:
+            entry = self._codes.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                self._codes.pop(key, None)
+                return EXPIRED
+            if hmac.compare_digest(entry[0].encode(), code.encode()):
+                del self._codes[key]
+                return VERIFIED
+            entry[1] += 1
+            if entry[1] >= self.max_attempts:
+                del self._codes[key]
+                return TOO_MANY_ATTEMPTS
+            return INVALID
+
+
+class RedisCodeStore(BaseCodeStore):
+    """
+    Store backed by the django-redis connection
+
+    Every code is a hash `{code, attempts}` with a TTL; verification runs as
+    one Lua script so concurrent guesses can't race the attempt counter.
+    """
+    verify_script = """
+local stored = redis.call('HGET', KEYS[1], 'code')
+if not stored then
+    return 0
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return 3
+end
+return 2
+"""
+    results = {0: EXPIRED, 1: VERIFIED, 2: INVALID, 3: TOO_MANY_ATTEMPTS}
+
+    def __init__(self, *args, **kwargs):
+        super(RedisCodeStore, self).__init__(*args, **kwargs)
+        self._script = None
+
+    @property
+    def connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def save(self, purpose, phone, code):
+        key = self.key(purpose, phone)
+        pipe = self.connection.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, 'code', code)
+        pipe.hset(key, 'attempts', 0)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def verify(self, purpose, phone, code):
+        connection = self.connection
+        if self._script is None:
+            self._script = connection.register_script(self.verify_script)
+        result = self._script(keys=[self.key(purpose, phone)],
+                              args=[code, self.max_attempts],
+                              client=connection)
+        return self.results[int(result)]
+
+
+_stores = {}
+
+
+def get_code_store():
+    """Return the store instance configured by `settings.VERIFICATION_CODE_STORE`"""
+    path = settings.VERIFICATION_CODE_STORE
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def fixed_code():
+    """
+    VERIFICATION_CODE_FIXED, honoured with the DummyProvider only - a
+    real gateway turns it off
+    """
+    fixed = getattr(settings, 'VERIFICATION_CODE_FIXED', None)
+    if fixed and isinstance(get_provider(), DummyProvider):
+        return fixed
+    return None
+
+
+def generate_code():
+    fixed = fixed_code()
+    if fixed:
+        return fixed
+    rand = random.SystemRandom()
+    return ''.join(rand.choice('0123456789')
+                   for _i in range(settings.VERIFICATION_CODE_LENGTH))
+
+
+def send_code(purpose, phone):
+    """Generate, store and deliver a code. Return (succeed, err_msg)"""
+    code = generate_code()
+    get_code_store().save(purpose, phone, code)
+    message = _('Your verification code is {code}, '
+                'valid for {minutes} minutes.').format(
+        code=code, minutes=settings.VERIFICATION_CODE_TIMEOUT // 60)
+    if settings.SMS_OUTBOX_ENABLED:
+        # delivered by the sms_worker management command
+        SMSOutbox.objects.enqueue(phone, message)
+        return True, ''
+    return get_provider().send(phone, message)
+
+
+def verify_code(purpose, phone, code):
+    """Check and consume a code. Return (succeed, err_msg)"""
+    fixed = fixed_code()
+    if fixed and code == fixed:
+        return True, ''
+    result = get_code_store().verify(purpose, phone, code)
+    if result == VERIFIED:
+        return True, ''
+    return False, ERROR_MESSAGES[result]
+
+
+def send_register_code(phone):
+    return send_code(PURPOSE_REGISTER, phone)
+
+
+def send_login_code(phone):
+    return send_code(PURPOSE_LOGIN, phone)
+
+
+def send_password_change_code(phone):
+    return send_code(PURPOSE_PASSWORD_CHANGE, phone)
+
+
+def verify_register_code(phone, code):
+    return verify_code(PURPOSE_REGISTER, phone, code)
+
+
+def verify_login_code(phone, code):
+    return verify_code(PURPOSE_LOGIN, phone, code)
+
+
+def verify_password_change_code(phone, code):
+    return verify_code(PURPOSE_PASSWORD_CHANGE, phone, code)
@@ -1 +1,5 @@
-from .user import *
\ No newline at end of file
+from .user import *
+from .export import *
+from .lookup import *
+from .metrics import *
+from .memory import *
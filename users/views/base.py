@@ -1,9 +1,44 @@
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+from rest_framework import status
 from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.generics import GenericAPIView, CreateAPIView
 from rest_framework.generics import RetrieveAPIView
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import APIView
+
+from ..hashing import HashingServiceBusy
+from ..metrics import metrics, view_name
+from ..middleware import API_PROFILE, get_profile
+from ..ratelimit import RateLimitExceeded, rate_limiter
+from .errors import APIError, RateLimited, SerializerValidationError, ServiceBusy
+from .errors import error_catalog
+from .validation import get_validator
+
+class PrerenderedResponse(Response):
+    """
+    Response whose JSON body is rendered already
+
+    `body` is the compact JSONRenderer output; any other renderer or
+    media type, e.g. `application/json; indent=4`, renders `data` as usual.
+    """
+
+    def __init__(self, data, body, **kwargs):
+        super(PrerenderedResponse, self).__init__(data, **kwargs)
+        self.body = body
+
+    @property
+    def rendered_content(self):
+        renderer = getattr(self, 'accepted_renderer', None)
+        if (type(renderer) is not JSONRenderer or self.content_type is not None or
+                getattr(self, 'accepted_media_type', None) != renderer.media_type):
+            return super(PrerenderedResponse, self).rendered_content
+        self['Content-Type'] = renderer.media_type
+        return self.body
 
-from .errors import APIError, SerializerValidationError
 
 class BaseAPIView(GenericAPIView):
     """
@@ -13,6 +48,13 @@ class BaseAPIView(GenericAPIView):
     exceptions
     """
 
+    # group of settings.RATE_LIMITS applied by `check_rate_limit`
+    rate_limit = None
+
+    # validate requests with a compiled RequestValidator instead of the
+    # serializer, see users/views/validation.py
+    fast_validation = False
+
     def handle_exception(self, exc):
         """
         Adds special handling four our APIError exception
@@ -25,9 +67,16 @@ class BaseAPIView(GenericAPIView):
         """
         if isinstance(exc, ValidationError):
             exc = SerializerValidationError(exc.detail)
+        elif isinstance(exc, HashingServiceBusy):
+            exc = ServiceBusy()
 
         if isinstance(exc, APIError):
-            response = Response(exc.data(), status=exc.status_code)
+            metrics.inc('api_errors_total', view=view_name(self.request), code=exc.code)
+            entry = error_catalog.get(exc)
+            if entry is not None:
+                response = PrerenderedResponse(*entry, status=exc.status_code)
+            else:
+                response = Response(exc.data(), status=exc.status_code)
             if exc.headers:
                 for key, val in exc.headers.items():
                     response[key] = val
@@ -35,6 +84,49 @@ class BaseAPIView(GenericAPIView):
 
         return super(BaseAPIView, self).handle_exception(exc)
 
+    def get_authenticators(self):
+        """
+        API_PROFILE_AUTHENTICATION_CLASSES on the API middleware profile,
+        for views keeping DRF's default authentication classes
+        """
+        if (get_profile(self.request) == API_PROFILE and
+                type(self).authentication_classes is APIView.authentication_classes):
+            return [import_string(path)() for path in settings.API_PROFILE_AUTHENTICATION_CLASSES]
+        return super(BaseAPIView, self).get_authenticators()
+
+    def get_validated_data(self):
+        """
+        The request data validated by the serializer class, like its `data`
+
+        :raises SerializerValidationError: on invalid data
+        """
+        data = self.request.data
+        if self.fast_validation and settings.FAST_REQUEST_VALIDATION:
+            validator = get_validator(self.get_serializer_class())
+            if validator.accepts(data):
+                return validator.validate(data)
+        serializer = self.get_serializer(data=data)
+        if not serializer.is_valid():
+            raise SerializerValidationError(serializer.errors)
+        return serializer.data
+
+    def check_rate_limit(self, phone=None, group=None):
+        """
+        Take a token from the per-phone, per-IP and global buckets of
+        `group`, default `rate_limit`, raise RateLimited if any of them
+        is empty.
+
+        Call it before touching the DB or the SMS gateway.
+        """
+        values = {
+            'phone': phone,
+            'ip': BaseThrottle().get_ident(self.request),
+        }
+        try:
+            rate_limiter.check(group or self.rate_limit, values)
+        except RateLimitExceeded as e:
+            raise RateLimited(e.retry_after)
+
 
 class UnauthenticatedAPIView(BaseAPIView):
     """
@@ -53,4 +145,53 @@ class AuthenticatedAPIView(BaseAPIView):
 
 
 class RetrieveCreateAPIView(RetrieveAPIView, CreateAPIView):
-    pass
\ No newline at end of file
+    pass
+
+
+class CachedUserResponseMixin(object):
+    """
+    Per-user GET endpoint served from a `UserResponseCache`
+
+    Responses carry ETag & Last-Modified headers derived from
+    `request.user.updated`; a matching If-None-Match / If-Modified-Since
+    gets a 304 without any serialization, anything else gets the cached
+    data of that version.
+
+    Set `response_cache` to a `UserResponseCache` of its own, and override
+    `get_response_data` if the data isn't `get_object()` serialized.
+    """
+    response_cache = None
+
+    def get_response_data(self):
+        return self.get_serializer(self.get_object()).data
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        version = user.updated
+        response_cache = self.response_cache
+        etag = response_cache.etag(user.pk, version)
+        last_modified = int(version.timestamp())
+
+        if self.not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = response_cache.get_or_set(user.pk, version, self.get_response_data)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or \
+                if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+
+# render the context-free errors once, as the API views are loaded
+error_catalog.build()
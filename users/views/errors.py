@@ -4,8 +4,14 @@ API error exception
 These will be caught and turned into an error response by our API classes.
 """
 
+from django.conf import settings
+from django.utils import translation
+from django.utils.translation import ugettext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 import logging
+import math
+import string
 
 log = logging.getLogger(__name__)
 
@@ -47,19 +53,22 @@ class APIError(Exception):
             raise NotImplementedError(
                 "One or more of the required Error fields is not defined")
 
+        template = ugettext(self.message_template)
         if kwargs:
             self.context = kwargs
             try:
-                self.message = self.message_template.format_map(self.context)
+                self.message = template.format_map(self.context)
             except KeyError as e:
                 log.error("Key missing in error template context: %s %r",
                           e, self.context.keys(), exc_info=True)
-                self.message = self.message_template
+                self.message = template
         else:
-            self.message = self.message_template
+            self.message = template
 
-        log.info("API error response (%s): %s",
-                 self.__class__.__name__, self.data())
+        # don't build the payload for a disabled level
+        if log.isEnabledFor(logging.INFO):
+            log.info("API error response (%s): %s",
+                     self.__class__.__name__, self.data())
 
         super(APIError, self).__init__(self.message)
 
@@ -133,6 +142,19 @@ class PhoneVerificationSendFailed(APIError):
     message_template = "Error sending phone verification code ({msg})"
 
 
+class RateLimited(APIError):
+    """Too many requests, e.g. verification codes for one phone"""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    code = 'rate_limited'
+    authenticate = False
+    message_template = "Too many requests - retry in {retry_after} seconds."
+
+    def __init__(self, retry_after, **kwargs):
+        retry_after = int(math.ceil(retry_after))
+        self.headers = {'Retry-After': str(retry_after)}
+        super(RateLimited, self).__init__(retry_after=retry_after, **kwargs)
+
+
 class PhoneVerificationError(APIError):
     """Phone verification code invalid
 
@@ -176,6 +198,15 @@ class InvalidNewPasswordSameAsOldPassword(APIError):
     message_template = "Incorrect new password same as old password"
 
 
+class ServiceBusy(APIError):
+    """Server is saturated, e.g. no free password hashing slot."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    code = 'service_busy'
+    authenticate = False
+    message_template = "Server is busy - please retry later."
+    headers = {'Retry-After': '1'}
+
+
 class InvalidRiskLevel(APIError):
     """Invalid risk_level."""
     status_code = status.HTTP_400_BAD_REQUEST
@@ -222,3 +253,65 @@ class PortfolioAppendInvalidAmount(APIError):
     code = 'portfolio_append_invalid_amount'
     authenticate = True
     message_template = 'You cannot append smaller than {min_append}.'
+
+
+class ErrorCatalog(object):
+    """
+    Pre-rendered JSON bodies of the context-free errors, per language
+
+    An error is context-free when its message template has no fields and
+    it keeps APIError's `__init__` and `data`: every instance then renders
+    to the same bytes, so `BaseAPIView.handle_exception` sends these
+    instead of rendering each response.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        # (error class, language): (data, JSON body)
+        self._entries = {}
+
+    @staticmethod
+    def context_free(cls):
+        if cls.status_code is None or cls.code is None or cls.message_template is None:
+            return False
+        if cls.__init__ is not APIError.__init__ or cls.data is not APIError.data:
+            return False
+        fields = [field for _text, field, _spec, _conv
+                  in string.Formatter().parse(cls.message_template)]
+        return not any(field is not None for field in fields)
+
+    @staticmethod
+    def error_classes(cls=APIError):
+        for subclass in cls.__subclasses__():
+            yield subclass
+            yield from ErrorCatalog.error_classes(subclass)
+
+    def build(self, languages=None):
+        """Render every context-free error, in LANGUAGE_CODE by default"""
+        for language in languages or [settings.LANGUAGE_CODE]:
+            with translation.override(language):
+                for cls in self.error_classes():
+                    if self.context_free(cls):
+                        self._render(cls, language)
+
+    def _render(self, cls, language):
+        error = cls.__new__(cls)
+        error.message = ugettext(cls.message_template)
+        data = error.data()
+        entry = self._entries[(cls, language)] = (data, JSONRenderer().render(data))
+        return entry
+
+    def get(self, exc):
+        """`(data, body)` of the error, None unless it is context-free"""
+        if not self.enabled or exc.context is not None:
+            return None
+        cls = type(exc)
+        language = translation.get_language()
+        entry = self._entries.get((cls, language))
+        if entry is None and self.context_free(cls):
+            # a language or an error class appearing after the build
+            entry = self._render(cls, language)
+        return entry
+
+
+error_catalog = ErrorCatalog()
@@ -0,0 +1,72 @@
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from . import errors
+from .base import BaseAPIView
+from .. import lookup
+from ..permissions import IsInternalService
+from ..phones import to_e164, to_national
+
+__all__ = ['UserLookupView']
+
+
+class UserLookupSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    phones = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        count = len(attrs.get('ids', [])) + len(attrs.get('phones', []))
+        if count > settings.USER_LOOKUP_MAX_ITEMS:
+            raise serializers.ValidationError(
+                'At most %d ids and phones per request.' % settings.USER_LOOKUP_MAX_ITEMS)
+        return attrs
+
+
+def _national(record):
+    """A copy of `record` - shared with the cache - with the national number"""
+    if record is None or not record['phone']:
+        return record
+    return dict(record, phone=to_national(record['phone']))
+
+
+class UserLookupView(BaseAPIView):
+    """
+    Resolve users by id and phone - internal services only.
+
+    Send the service key in the `X-Service-Key` header, and up to
+    USER_LOOKUP_MAX_ITEMS `ids` and `phones`. The response maps every
+    given value to the user's record, or to null for unknown users; the
+    unknown values are listed again in `misses`:
+
+        {"ids": {"1": {...}, "7": null},
+         "phones": {"+86 186 0000 1111": {...}},
+         "misses": {"ids": [7], "phones": []}}
+
+    Possible errors:
+        SerializerValidationError
+    """
+    authentication_classes = ()
+    permission_classes = [IsInternalService]
+    serializer_class = UserLookupSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            raise errors.SerializerValidationError(serializer.errors)
+
+        ids = serializer.validated_data.get('ids', [])
+        phones = {phone: to_e164(phone)
+                  for phone in serializer.validated_data.get('phones', [])}
+        by_id, by_phone = lookup.lookup_users(ids, list(set(phones.values())))
+
+        by_id = {user_id: _national(record) for user_id, record in by_id.items()}
+        by_phone = {phone: _national(by_phone[normalized]) for phone, normalized in phones.items()}
+        return Response({
+            'ids': by_id,
+            'phones': by_phone,
+            'misses': {
+                'ids': [user_id for user_id in ids if by_id[user_id] is None],
+                'phones': [phone for phone in phones if by_phone[phone] is None],
+            },
+        })
@@ -0,0 +1,53 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from . import errors
+from .base import BaseAPIView
+from .. import memory
+from ..permissions import IsInternalService
+
+__all__ = ['MemoryDiagnosticsView']
+
+
+class MemoryActionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(['start', 'stop'])
+    frames = serializers.IntegerField(min_value=1, max_value=100, required=False)
+
+
+class MemoryReportSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=20)
+    group_by = serializers.ChoiceField(memory.GROUP_BY, default='lineno')
+
+
+class MemoryDiagnosticsView(BaseAPIView):
+    """
+    Memory of the worker process answering - internal services only.
+
+    GET reports the tracked objects, the in-process caches and, while
+    tracing, the top `limit` allocation sites grouped by `group_by`
+    (lineno, filename or traceback), as a diff against the baseline.
+
+    POST `{"action": "start"}` starts tracing with `frames` frames per
+    allocation and takes a new baseline, `{"action": "stop"}` stops it.
+
+    Possible errors:
+        SerializerValidationError
+    """
+    authentication_classes = ()
+    permission_classes = [IsInternalService]
+
+    def get(self, request):
+        serializer = MemoryReportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            raise errors.SerializerValidationError(serializer.errors)
+        return Response(memory.report(**serializer.validated_data))
+
+    def post(self, request):
+        serializer = MemoryActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            raise errors.SerializerValidationError(serializer.errors)
+        if serializer.validated_data['action'] == 'start':
+            memory.start(serializer.validated_data.get('frames'))
+        else:
+            memory.stop()
+        return Response(memory.report(limit=1))
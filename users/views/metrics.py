@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from ..metrics import metrics
+
+__all__ = ['metrics_export']
+
+
+def metrics_export(request):
+    """The metrics of all worker processes, for Prometheus to scrape"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
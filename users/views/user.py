@@ -1,24 +1,54 @@
+import time
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from rest_framework import serializers
+from rest_framework.fields import empty
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.response import Response
 from . import errors
+from .. import hashing
+from ..models import DeviceSession
 from .base import UnauthenticatedAPIView
 from .base import AuthenticatedAPIView
-from sms import send_login_code, send_register_code, send_password_change_code
-from sms import verify_login_code, verify_register_code, verify_password_change_code
+from .base import CachedUserResponseMixin
+from ..bloom import phone_bloom
+from ..caching import UserResponseCache
+from ..phones import normalize_phone, to_e164, to_national
+from ..routers import pin_on_write, read_primary_if_pinned
+from ..writebehind import last_login_buffer
+from ..verification import send_login_code, send_register_code, send_password_change_code
+from ..verification import verify_login_code, verify_register_code, verify_password_change_code
 from sms import PHONE_REGEX
 from copy import deepcopy
 
 UserModel = get_user_model()
 
-phone_field = serializers.RegexField(PHONE_REGEX, required=True,
-                                     help_text='Chinese mobile number, like 18600001111')
+class PhoneField(serializers.RegexField):
+    """
+    Chinese mobile number in any format, validated against PHONE_REGEX
+    without formatting and +86 prefix - its value is the E.164 form
+    """
+
+    def prepare(self, data):
+        return normalize_phone(data) if isinstance(data, str) else data
+
+    def finish(self, value):
+        return to_e164(value) if value else value
+
+    def run_validation(self, data=empty):
+        value = super(PhoneField, self).run_validation(self.prepare(data))
+        return self.finish(value)
+
+
+phone_field = PhoneField(PHONE_REGEX, required=True,
+                         help_text='Chinese mobile number, like 18600001111 or +86 186 0000 1111')
 
 pw_field = serializers.CharField(
     validators=[validate_password],
@@ -31,12 +61,16 @@ pw_field_non_required = serializers.CharField(
 
 
 def kick_out_user(user):
-    try:
-        # kick out user once reset password
-        token = Token.objects.get(user_id=user)
-        token.delete()
-    except Token.DoesNotExist:
-        pass
+    # kick out user from all devices once reset password
+    DeviceSession.objects.revoke_all(user)
+
+
+def get_device_id(request):
+    """Client's device id, from the X-Device-Id header or `device_id` field"""
+    device_id = request.META.get('HTTP_X_DEVICE_ID')
+    if not device_id and hasattr(request.data, 'get'):
+        device_id = request.data.get('device_id')
+    return str(device_id or '')[:64]
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -79,6 +113,13 @@ class RegisterView(UnauthenticatedAPIView):
     """
     serializer_class = RegisterSerializer
     model = UserModel
+    rate_limit = 'sms_code'
+    fast_validation = True
+
+    # how long, and how often, one retry of a submission in flight waits
+    # for its result - the others get a 503 right away
+    wait_timeout = 1.0
+    wait_interval = 0.05
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -88,55 +129,138 @@ class RegisterView(UnauthenticatedAPIView):
         return super(RegisterView, self).get_serializer_class()
 
     def post(self, request):
-        serializer = self.get_serializer(data=request.data)
-        if not serializer.is_valid():
-            raise errors.SerializerValidationError(serializer.errors)
-
-        phone = serializer.data['phone']
-        if self.model.objects.filter(phone=phone, verified=True).exists():
-            raise errors.PhoneRegistered()
-
-        code = serializer.data.get('code', None)
+        data = self.get_validated_data()
+        phone = data['phone']
+        code = data.get('code', None)
+        # the login following the registration reads from the primary
+        pin_on_write(phone=phone)
         if not code:
             # Step1: send verify code to phone
+            self.check_rate_limit(phone=phone)
+            if (phone_bloom.might_contain(phone) and
+                    self.model.objects.by_phone(phone).filter(verified=True).exists()):
+                raise errors.PhoneRegistered()
             succeed, err_msg = send_register_code(phone)
             if not succeed:
                 raise errors.PhoneVerificationSendFailed(msg=err_msg)
             return Response(status=status.HTTP_200_OK)
         else:
             # Step2: register with phone & code
+            data = self.register(phone, code, data['password'],
+                                 get_device_id(request))
+            return Response(data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def retry_cache_key(phone, code, password, device_id=''):
+        # keyed hash: neither the code nor the password is in the key, and
+        # only the very same submission finds the result
+        digest = salted_hmac('users.register', '\0'.join([phone, code, password, device_id]))
+        return 'register:%s' % digest.hexdigest()
+
+    def register(self, phone, code, password, device_id=''):
+        """
+        Step2 - idempotent for retries of the same submission
+
+        A succeeded registration is remembered for REGISTER_RETRY_WINDOW
+        seconds, so a client retrying the same phone, code, password and
+        device gets the same user id and token back - while that session
+        lasts. A retry arriving while the first submission is in flight
+        waits a little for its result.
+        """
+        self.check_rate_limit(phone=phone, group='verify_code')
+        key = self.retry_cache_key(phone, code, password, device_id)
+        data = self._replay(key)
+        if data is not None:
+            return data
+        if not cache.add(key + ':lock', 1, 30):
+            data = self._wait_for_result(key)
+            if data is None:
+                raise errors.ServiceBusy()
+            return data
+
+        try:
             succeed, err_msg = verify_register_code(phone, code)
             if not succeed:
                 raise errors.PhoneVerificationError(reason=err_msg)
+            # hash outside of the transaction - keep the row lock short
+            encoded_password = hashing.make_password(password)
 
-            # get phone related user
             try:
-                user = self.model.objects.get(phone=phone)
-            except self.model.DoesNotExist:
-                user = self.model.objects.create_by_phone(phone)
-            # setup password
-            user.set_password(serializer.data['password'])
-            # Update login time - will save user in mark_verified
-            user.last_login = timezone.now()
-            # mark as verified - means the register success done.
-            user.mark_verified()
-
-            # create token
-            token = Token.objects.create(user=user)
-            return Response({'user_id': user.id, 'token': token.key},
-                            status=status.HTTP_200_OK)
+                data = self._create_verified_user(phone, encoded_password, device_id)
+            except IntegrityError:
+                # lost an insert race on the phone - the winner is visible now
+                data = self._create_verified_user(phone, encoded_password, device_id)
+            pin_on_write(token=data['token'])
+            cache.set(key, data, settings.REGISTER_RETRY_WINDOW)
+            return data
+        finally:
+            # only the lock this request took
+            cache.delete(key + ':lock')
+
+    def _replay(self, key):
+        """The remembered result, unless its session was revoked since"""
+        data = cache.get(key)
+        if data is None:
+            return None
+        alive = DeviceSession.objects.db_manager(DEFAULT_DB_ALIAS).filter(
+            key=data['token'], expires__gt=timezone.now()).exists()
+        if not alive:
+            cache.delete(key)
+            return None
+        return data
+
+    def _wait_for_result(self, key):
+        # one waiting thread per submission, whatever the number of retries
+        if not cache.add(key + ':waiter', 1, self.wait_timeout):
+            return None
+        try:
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.wait_interval)
+                data = self._replay(key)
+                if data is not None:
+                    return data
+            return None
+        finally:
+            cache.delete(key + ':waiter')
+
+    @transaction.atomic
+    def _create_verified_user(self, phone, encoded_password, device_id):
+        """
+        Mark the phone's user verified, creating it if needed, and start
+        the device's session - in one transaction of 3 queries.
+        """
+        now = timezone.now()
+        user = self.model.objects.select_for_update().filter(phone=phone).first()
+        if user is None:
+            user = self.model(username=phone, phone=phone,
+                              password=encoded_password, last_login=now,
+                              verified=True, verified_ts=now)
+            user.save(force_insert=True)
+            session = DeviceSession.objects.create(user=user, device_id=device_id)
+        elif user.verified:
+            raise errors.PhoneRegistered()
+        else:
+            # created earlier by UserManager.create_by_phone
+            user.password = encoded_password
+            user.last_login = now
+            user.verified = True
+            user.verified_ts = now
+            user.save(update_fields=['password', 'last_login', 'verified',
+                                     'verified_ts', 'updated'])
+            session = DeviceSession.objects.start(user, device_id)
+        return {'user_id': user.id, 'token': session.key}
 
 
 class BaseLogin(object):
     model = UserModel
 
-    def get_user(self, serializer):
-        if not serializer.is_valid():
-            raise errors.SerializerValidationError(serializer.errors)
-
-        phone = serializer.data['phone']
+    def get_user(self, phone):
+        if not phone_bloom.might_contain(phone):
+            raise errors.PhoneUnregistered()
+        read_primary_if_pinned(phone)
         try:
-            user = self.model.objects.get(phone=phone, verified=True)
+            user = self.model.objects.by_phone(phone).get(verified=True)
         except self.model.DoesNotExist:
             raise errors.PhoneUnregistered()
         if not user.is_active:
@@ -144,11 +268,12 @@ class BaseLogin(object):
         return user
 
     def login_resp(self, user):
-        # Update login time.
+        # Update login time - written behind, in bulk
         user.last_login = timezone.now()
-        token = Token.objects.get_or_create(user=user)[0].key
+        last_login_buffer.record(user.pk, user.last_login)
+        session = DeviceSession.objects.start(user, get_device_id(self.request))
         return Response({'user_id': user.id,
-                         'token': token},
+                         'token': session.key},
                         status=status.HTTP_200_OK)
 
 
@@ -175,13 +300,18 @@ class PhoneCodeLoginView(UnauthenticatedAPIView, BaseLogin):
         PhoneVerificationError
     """
     serializer_class = PhoneCodeSerializer
+    rate_limit = 'sms_code'
+    fast_validation = True
 
     def post(self, request):
-        serializer = self.get_serializer(data=request.data)
-        user = self.get_user(serializer)
+        data = self.get_validated_data()
+        phone = data['phone']
+        code = data.get('code', None)
+        if not code:
+            # Step1 sends a code - throttle before looking up the user
+            self.check_rate_limit(phone=phone)
+        user = self.get_user(phone)
 
-        phone = serializer.data['phone']
-        code = serializer.data.get('code', None)
         if not code:
             # Step1: send verify code to phone
             succeed, err_msg = send_login_code(phone)
@@ -214,15 +344,16 @@ class PasswordLoginView(UnauthenticatedAPIView, BaseLogin):
         IncorrectPassword
     """
     serializer_class = PasswordLoginSerializer
+    fast_validation = True
 
     def post(self, request):
-        serializer = self.get_serializer(data=request.data)
-        user = self.get_user(serializer)
+        data = self.get_validated_data()
+        user = self.get_user(data['phone'])
 
         # check password
         if not user.password:
             raise errors.PasswordNotExist()
-        if not user.check_password(serializer.data['password']):
+        if not hashing.check_password(user, data['password']):
             raise errors.IncorrectPassword()
         return self.login_resp(user)
 
@@ -262,6 +393,7 @@ class SetPasswordByPhoneCodeUnauthSteop2Serializer(serializers.Serializer):
 
 class SetPasswordByPhoneCodeView(AuthenticatedAPIView):
     serializer_class = SetPasswordByPhoneCodeSerializer
+    rate_limit = 'sms_code'
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -283,6 +415,7 @@ class SetPasswordByPhoneCodeView(AuthenticatedAPIView):
 
         if not v_code:
             # step 1: request code
+            self.check_rate_limit(phone=user.phone)
             succeed, err_msg = send_password_change_code(user.phone)
             if not succeed:
                 raise errors.PhoneVerificationSendFailed()
@@ -294,10 +427,10 @@ class SetPasswordByPhoneCodeView(AuthenticatedAPIView):
             if not succeed:
                 raise errors.PhoneVerificationError()
             new_password = serializer.data['new_password']
-            user.set_password(new_password)
+            hashing.set_password(user, new_password)
             user.save()
             kick_out_user(user)
-            token = Token.objects.get_or_create(user=user)[0].key
+            token = DeviceSession.objects.start(user, get_device_id(request)).key
 
             return Response({'user_id': user.id,
                              'token': token
@@ -307,6 +440,7 @@ class SetPasswordByPhoneCodeView(AuthenticatedAPIView):
 
 class SetPasswordByPhoneCodeUnauthView(UnauthenticatedAPIView):
     serializer_class = SetPasswordByPhoneCodeUnauthSerializer
+    rate_limit = 'sms_code'
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -321,12 +455,14 @@ class SetPasswordByPhoneCodeUnauthView(UnauthenticatedAPIView):
             raise errors.SerializerValidationError(serializer.errors)
 
         phone = serializer.data.get('phone')
+        v_code = serializer.data.get('code', None)
+        if not v_code:
+            self.check_rate_limit(phone=phone)
+
         user = UserModel.objects.get(phone=phone)
         if not user.is_active:
             raise errors.AccountInactive()
 
-        v_code = serializer.data.get('code', None)
-
         if not v_code:
             # step 1: request code
             succeed, err_msg = send_password_change_code(user.phone)
@@ -340,12 +476,12 @@ class SetPasswordByPhoneCodeUnauthView(UnauthenticatedAPIView):
             if not succeed:
                 raise errors.PhoneVerificationError()
             new_password = serializer.data['new_password']
-            if user.check_password(new_password):
+            if hashing.check_password(user, new_password):
                 raise errors.InvalidNewPasswordSameAsOldPassword()
-            user.set_password(new_password)
+            hashing.set_password(user, new_password)
             user.save()
             kick_out_user(user)
-            token = Token.objects.get_or_create(user=user)[0].key
+            token = DeviceSession.objects.start(user, get_device_id(request)).key
 
             return Response({'user_id': user.id,
                              'token': token
@@ -369,16 +505,16 @@ class SetPasswordByOldPasswordView(AuthenticatedAPIView):
         if old_password == new_password:
             raise errors.InvalidNewPasswordSameAsOldPassword()
 
-        if not user.check_password(old_password):
+        if not hashing.check_password(user, old_password):
             raise errors.IncorrectPassword()
 
         if not user.is_active:
             raise errors.AccountInactive()
 
-        user.set_password(new_password)
+        hashing.set_password(user, new_password)
         user.save()
         kick_out_user(user)
-        token = Token.objects.get_or_create(user=user)[0].key
+        token = DeviceSession.objects.start(user, get_device_id(request)).key
 
         return Response({'user_id': user.id,
                          'token': token
@@ -404,17 +540,35 @@ class LogoutView(AuthenticatedAPIView):
         return Response(status=status.HTTP_200_OK)
 
 
+class LogoutAllView(AuthenticatedAPIView):
+    """Log the user out of all devices."""
+    serializer_class = LogoutSerializer
+
+    def post(self, request):
+        kick_out_user(request.user)
+        return Response(status=status.HTTP_200_OK)
+
+
 class UserDetailsSerializer(serializers.ModelSerializer):
+    # the national number, as before phones were stored in E.164
+    phone = serializers.SerializerMethodField()
+
     class Meta:
         model = UserModel
         fields = ('id', 'phone')
 
+    def get_phone(self, user):
+        return to_national(user.phone) if user.phone else user.phone
 
-class UserDetailsView(AuthenticatedAPIView, RetrieveAPIView):
+
+class UserDetailsView(CachedUserResponseMixin, AuthenticatedAPIView, RetrieveAPIView):
     """
     User Detail View.
+
+    Cached per user, supports conditional GETs (If-None-Match / If-Modified-Since).
     """
     serializer_class = UserDetailsSerializer
+    response_cache = UserResponseCache('user-details')
     action = 'retrieve'
 
     def get_object(self):
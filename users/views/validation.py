@@ -0,0 +1,168 @@
+"""
+Fast-path request validation
+
+The login and register endpoints validated every request by creating a
+serializer - which deep-copies all its declared fields - and read the
+result through `serializer.data`, which runs `to_representation` again
+on every access. `RequestValidator` compiles such a serializer once into
+per-field checks, then validates JSON objects with the same rules and
+the same errors - the `err_fields` of SerializerValidationError -
+without creating anything per request.
+
+Only plain serializers of CharFields (RegexField, PhoneField ...) without
+`validate*` methods compile. Other request data, e.g. form encoded, is
+left to the serializer, see `BaseAPIView.get_validated_data`; set
+FAST_REQUEST_VALIDATION = False to always use the serializers.
+
+A field overriding `run_validation` must do it through `prepare(data)`
+and `finish(value)` methods, which the compiled checks call as well.
+"""
+from collections.abc import Mapping
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.fields import empty, get_error_detail
+from rest_framework.utils import html
+
+from .errors import SerializerValidationError
+
+# methods whose behaviour CompiledField reproduces
+FIELD_METHODS = ('run_validation', 'validate_empty_values', 'to_internal_value',
+                 'run_validators', 'get_value')
+
+
+class CompiledField(object):
+    """
+    The `run_validation` of a CharField, for JSON input
+
+    :raises ImproperlyConfigured: for fields it can't reproduce
+    """
+
+    def __init__(self, name, field):
+        if not isinstance(field, serializers.CharField):
+            raise ImproperlyConfigured(
+                "Can't compile field %r, a %s" % (name, type(field).__name__))
+        overridden = {method for method in FIELD_METHODS
+                      if getattr(type(field), method) is not getattr(serializers.CharField, method)}
+        if hasattr(field, 'prepare') and hasattr(field, 'finish'):
+            overridden.discard('run_validation')
+        validators = list(field.validators)
+        if (overridden or field.read_only or field.default is not empty or
+                field.source not in (None, name) or
+                any(hasattr(validator, 'set_context') for validator in validators)):
+            raise ImproperlyConfigured("Can't compile field %r" % name)
+
+        self.name = name
+        self.required = field.required
+        self.allow_blank = field.allow_blank
+        self.allow_null = field.allow_null
+        self.trim_whitespace = field.trim_whitespace
+        self.validators = validators
+        self.error_messages = field.error_messages
+        self.prepare = getattr(field, 'prepare', None)
+        self.finish = getattr(field, 'finish', None)
+
+    def fail(self, key):
+        message = str(self.error_messages[key])
+        raise ValidationError([ErrorDetail(message, code=key)])
+
+    def validate(self, data):
+        """
+        Validated value of the field in `data`, `empty` when it's skipped
+
+        :raises ValidationError: with the errors of the field
+        """
+        value = data.get(self.name, empty)
+        if self.prepare is not None:
+            value = self.prepare(value)
+
+        if value == '' or (self.trim_whitespace and str(value).strip() == ''):
+            if not self.allow_blank:
+                self.fail('blank')
+            value = ''
+        elif value is empty:
+            if self.required:
+                self.fail('required')
+            return empty
+        elif value is None:
+            if not self.allow_null:
+                self.fail('null')
+        else:
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                self.fail('invalid')
+            value = str(value)
+            if self.trim_whitespace:
+                value = value.strip()
+            self.run_validators(value)
+
+        if self.finish is not None:
+            value = self.finish(value)
+        return value
+
+    def run_validators(self, value):
+        errors = []
+        for validator in self.validators:
+            try:
+                validator(value)
+            except ValidationError as exc:
+                errors.extend(exc.detail)
+            except DjangoValidationError as exc:
+                errors.extend(get_error_detail(exc))
+        if errors:
+            raise ValidationError(errors)
+
+
+class RequestValidator(object):
+    """
+    :param serializer_class: serializer to validate like
+    :raises ImproperlyConfigured: if it can't be compiled
+    """
+
+    def __init__(self, serializer_class):
+        fields = serializer_class._declared_fields
+        meta = getattr(serializer_class, 'Meta', None)
+        if (serializer_class.validate is not serializers.Serializer.validate or
+                getattr(meta, 'validators', None) or
+                any(hasattr(serializer_class, 'validate_' + name) for name in fields)):
+            raise ImproperlyConfigured(
+                "Can't compile %s, it has validation methods" % serializer_class.__name__)
+        self.serializer_class = serializer_class
+        self.fields = [CompiledField(name, field) for name, field in fields.items()]
+
+    @staticmethod
+    def accepts(data):
+        """Whether `validate` handles `data`, a parsed request body"""
+        return isinstance(data, Mapping) and not html.is_html_input(data)
+
+    def validate(self, data):
+        """
+        `data` validated, as the serializer's `data` would be
+
+        :raises SerializerValidationError: with the serializer's errors
+        """
+        validated = {}
+        errors = {}
+        for field in self.fields:
+            try:
+                value = field.validate(data)
+            except ValidationError as exc:
+                errors[field.name] = exc.detail
+            else:
+                if value is not empty:
+                    validated[field.name] = value
+        if errors:
+            raise SerializerValidationError(errors)
+        return validated
+
+
+# serializer class: RequestValidator
+_validators = {}
+
+
+def get_validator(serializer_class):
+    validator = _validators.get(serializer_class)
+    if validator is None:
+        validator = _validators[serializer_class] = RequestValidator(serializer_class)
+    return validator
@@ -0,0 +1,119 @@
+"""
+Write-behind buffers for activity timestamps
+
+Login and authentication only record `(pk, timestamp)` in an in-process
+buffer; the buffer writes all pending rows with one bulk
+`UPDATE ... SET field = CASE pk WHEN ... END` once it holds
+ACTIVITY_FLUSH_SIZE entries or ACTIVITY_FLUSH_INTERVAL seconds passed.
+Due buffers are also flushed at the end of every request and at worker
+shutdown.
+
+A worker killed with SIGKILL loses at most one interval of timestamps.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, models
+
+log = logging.getLogger(__name__)
+
+
+class ActivityBuffer(object):
+    """
+    Collects the latest timestamp per primary key of `model_label`
+
+    :param model_label: 'app_label.ModelName'
+    :param field: name of the DateTimeField to update
+    """
+    # rows per UPDATE statement
+    chunk_size = 500
+
+    def __init__(self, model_label, field):
+        self.model_label = model_label
+        self.field = field
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stats = dict(recorded=0, flushed=0, flushes=0, errors=0)
+
+    def record(self, pk, timestamp):
+        with self._lock:
+            current = self._pending.get(pk)
+            if current is None or current < timestamp:
+                self._pending[pk] = timestamp
+            self._stats['recorded'] += 1
+        if self.due():
+            self.flush()
+
+    def due(self):
+        return bool(self._pending) and (
+            len(self._pending) >= settings.ACTIVITY_FLUSH_SIZE or
+            time.monotonic() - self._last_flush >= settings.ACTIVITY_FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write all pending timestamps, return the number of rows"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        model = apps.get_model(self.model_label)
+        items = list(pending.items())
+        written = 0
+        for start in range(0, len(items), self.chunk_size):
+            chunk = items[start:start + self.chunk_size]
+            value = models.Case(
+                *[models.When(pk=pk, then=models.Value(ts)) for pk, ts in chunk],
+                output_field=model._meta.get_field(self.field))
+            try:
+                model.objects.filter(pk__in=[pk for pk, _ts in chunk]).update(
+                    **{self.field: value})
+            except DatabaseError:
+                log.exception("Flushing %s.%s failed", self.model_label, self.field)
+                with self._lock:
+                    self._stats['errors'] += 1
+                    # retry with the next flush, unless newer values came in
+                    for pk, ts in chunk:
+                        self._pending.setdefault(pk, ts)
+                continue
+            written += len(chunk)
+        with self._lock:
+            self._stats['flushed'] += written
+            self._stats['flushes'] += 1
+        return written
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+
+last_login_buffer = ActivityBuffer(settings.AUTH_USER_MODEL, 'last_login')
+last_seen_buffer = ActivityBuffer('users.DeviceSession', 'last_seen')
+buffers = (last_login_buffer, last_seen_buffer)
+
+
+def flush_due(**kwargs):
+    for buffer in buffers:
+        if buffer.due():
+            buffer.flush()
+
+
+def flush_all():
+    for buffer in buffers:
+        try:
+            buffer.flush()
+        except Exception:
+            log.exception("Flushing %s.%s at exit failed",
+                          buffer.model_label, buffer.field)
+
+
+request_finished.connect(flush_due, dispatch_uid='users.writebehind.flush_due')
+atexit.register(flush_all)